@@ -6,5 +6,14 @@ pip install -r requirements.txt
 # Apply migrations
 python manage.py migrate
 
+# Create the shared cache table (a no-op for other cache backends)
+python manage.py createcachetable
+
+# Recount property facets
+python manage.py rebuild_facets
+
+# Recount map clusters
+python manage.py rebuild_map_clusters
+
 # Collect static files
 python manage.py collectstatic --noinput
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CheckoutConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "checkout"
+
+    def ready(self):
+        import checkout.signals
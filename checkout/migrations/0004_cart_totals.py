@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 20:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_items(apps, schema_editor):
+    # Totals are left NULL and computed on the next read of each cart
+    Cart = apps.get_model("checkout", "Cart")
+    CartItem = apps.get_model("checkout", "CartItem")
+    counts = CartItem.objects.filter(cart=OuterRef("pk")).values("cart").annotate(count=Count("pk")).values("count")
+    Cart.objects.update(total=None, item_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("checkout", "0003_delete_payment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=15, null=True
+            ),
+        ),
+        migrations.RunPython(count_existing_items, migrations.RunPython.noop),
+    ]
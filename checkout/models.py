@@ -6,9 +6,16 @@ class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
     created_at = models.DateTimeField(auto_now_add=True)
     is_paid = models.BooleanField(default=False)
+    # Kept up to date by checkout.totals; a NULL total is recomputed on read
+    total = models.DecimalField(max_digits=15, decimal_places=2, null=True, default=0)
+    item_count = models.PositiveIntegerField(default=0)
 
     def total_price(self):
-        return sum(item.property.price for item in self.items.all())
+        if self.total is None:
+            from .totals import recompute_totals
+            recompute_totals(Cart.objects.filter(pk=self.pk))
+            self.refresh_from_db(fields=['total', 'item_count'])
+        return self.total
 
     def __str__(self):
         return f"{self.user.email}'s Cart"
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import *
 from listings.models import Property
@@ -20,9 +21,27 @@ class CartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'total_price', 'created_at']
-        read_only_fields = ['user']
+        fields = ['id', 'user', 'items', 'total_price', 'item_count', 'created_at']
+        read_only_fields = ['user', 'item_count']
 
     def get_total_price(self, obj):
         return obj.total_price()
 
+
+
+def batch_limit():
+    return getattr(settings, 'CART_BATCH_MAX_ITEMS', 100)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    remove = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError("Provide property ids to add and/or remove.")
+        if len(data['add']) + len(data['remove']) > batch_limit():
+            raise serializers.ValidationError(f"At most {batch_limit()} property ids per request.")
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError("A property can't be both added and removed.")
+        return data
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from listings.models import Property
+
+from .models import CartItem
+from .totals import apply_item, invalidate_for_property, per_item_updates_enabled
+
+
+@receiver(post_save, sender=CartItem)
+def add_to_cart_total(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and per_item_updates_enabled():
+        apply_item(instance.cart_id, instance.property.price, 1)
+
+
+@receiver(post_delete, sender=CartItem)
+def remove_from_cart_total(sender, instance, **kwargs):
+    if per_item_updates_enabled():
+        apply_item(instance.cart_id, instance.property.price, -1)
+
+
+@receiver(post_save, sender=Property)
+def invalidate_cart_totals(sender, instance, raw=False, **kwargs):
+    # listings.signals.remember_aggregate_keys loads the stored price before the save
+    price_before = getattr(instance, '_price_before', None)
+    if not raw and price_before is not None and price_before != instance.price:
+        invalidate_for_property(instance.pk)
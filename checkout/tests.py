@@ -1,3 +1,128 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from listings.tests import make_property, make_user
+from .models import Cart, CartItem
+from .views import CartBatchView, CartView
+
+
+class CartQueryBudgetTests(TestCase):
+
+    def setUp(self):
+        self.agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.cart = Cart.objects.create(user=self.buyer)
+
+    def test_cart_budget_holds_as_items_grow(self):
+        for count in (1, 15):
+            for i in range(count):
+                CartItem.objects.create(cart=self.cart, property=make_property(self.agent, price=10))
+
+            client = APIClient()
+            client.force_authenticate(User.objects.get(pk=self.buyer.pk))
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get('/api/checkout/cart/')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['items']), self.cart.items.count())
+            self.assertEqual(len(ctx.captured_queries), CartView.query_budget['get'])
+
+
+class CartTotalTests(TestCase):
+
+    def setUp(self):
+        self.agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def cart(self):
+        return Cart.objects.get(user=self.buyer)
+
+    def test_add_and_remove_keep_stored_total(self):
+        house = make_property(self.agent, price=1500)
+        flat = make_property(self.agent, price=250)
+        self.assertEqual(self.client.post(f'/api/checkout/cart/add/{house.pk}/').status_code, 201)
+        self.assertEqual(self.client.post(f'/api/checkout/cart/add/{flat.pk}/').status_code, 201)
+        self.assertEqual((self.cart().total, self.cart().item_count), (1750, 2))
+
+        self.client.delete(f'/api/checkout/cart/remove/{house.pk}/')
+        self.assertEqual((self.cart().total, self.cart().item_count), (250, 1))
+
+        response = self.client.delete(f'/api/checkout/cart/remove/{flat.pk}/')
+        self.assertIn('now empty', response.data['message'])
+        self.assertFalse(Cart.objects.filter(user=self.buyer).exists())
+
+    def test_price_change_is_recomputed_on_read(self):
+        house = make_property(self.agent, price=1500)
+        flat = make_property(self.agent, price=250)
+        cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=cart, property=house)
+        CartItem.objects.create(cart=cart, property=flat)
+
+        house.price = 2000
+        house.save()
+        self.assertIsNone(self.cart().total)
+
+        response = self.client.get('/api/checkout/cart/')
+        self.assertEqual((response.data['total_price'], response.data['item_count']), (2250, 2))
+        self.assertEqual(self.cart().total, 2250)
+
+        # Other edits leave the stored total alone
+        flat.title = 'Flat'
+        flat.save()
+        cart = self.cart()
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.total_price(), 2250)
+
+
+class CartBatchTests(TestCase):
+
+    def setUp(self):
+        self.agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def batch(self, **data):
+        return self.client.post('/api/checkout/cart/items/', data, format='json')
+
+    def test_adds_and_removes_in_one_request(self):
+        props = [make_property(self.agent, price=100 * (i + 1)) for i in range(4)]
+        hidden = make_property(self.agent, is_published=False)
+
+        response = self.batch(add=[props[0].pk, props[1].pk, props[2].pk, hidden.pk, 999999])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changes']['added'], [props[0].pk, props[1].pk, props[2].pk])
+        self.assertEqual(response.data['changes']['ignored'], [hidden.pk, 999999])
+        self.assertEqual((response.data['total_price'], response.data['item_count']), (600, 3))
+
+        # Adding what is already there is not an error
+        response = self.batch(add=[props[0].pk, props[3].pk], remove=[props[1].pk, props[2].pk])
+        self.assertEqual(response.data['changes'], {
+            'added': [props[3].pk], 'removed': [props[1].pk, props[2].pk], 'ignored': [props[0].pk],
+        })
+        self.assertEqual(sorted(item['property']['id'] for item in response.data['items']),
+                         [props[0].pk, props[3].pk])
+        self.assertEqual(Cart.objects.get(user=self.buyer).total, 500)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        Cart.objects.create(user=self.buyer)
+        for count in (1, 20):
+            ids = [make_property(self.agent).pk for _ in range(count)]
+            with CaptureQueriesContext(connection) as added:
+                self.assertEqual(self.batch(add=ids).status_code, 200)
+            with CaptureQueriesContext(connection) as removed:
+                self.assertEqual(self.batch(remove=ids).status_code, 200)
+            for ctx in (added, removed):
+                queries = [q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+                self.assertLessEqual(len(queries), CartBatchView.query_budget['post'])
+
+    def test_rejects_invalid_batches(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch(add=[1], remove=[1]).status_code, 400)
+        with self.settings(CART_BATCH_MAX_ITEMS=2):
+            self.assertEqual(self.batch(add=[1, 2, 3]).status_code, 400)
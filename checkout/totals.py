@@ -0,0 +1,73 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Cart, CartItem
+
+# Each cart stores its total and item count, so reading a cart needs no
+# aggregate. Adding or removing an item adjusts them with one UPDATE in the
+# same transaction (see signals.py). A listing price change can't be applied
+# as a delta cheaply, so it sets the total of every cart holding the listing
+# to NULL, and the next read recomputes it with one SQL aggregate. Batch
+# changes suspend the per-item updates and recompute once at the end.
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+def total_subquery():
+    return Coalesce(
+        Subquery(
+            CartItem.objects.filter(cart=OuterRef('pk'))
+            .values('cart')
+            .annotate(total=Sum('property__price'))
+            .values('total'),
+            output_field=MONEY,
+        ),
+        Value(0),
+        output_field=MONEY,
+    )
+
+
+def count_subquery():
+    return Coalesce(
+        Subquery(
+            CartItem.objects.filter(cart=OuterRef('pk')).values('cart').annotate(count=Count('pk')).values('count')
+        ),
+        Value(0),
+    )
+
+
+_state = threading.local()
+
+
+@contextmanager
+def per_item_updates_suspended():
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def per_item_updates_enabled():
+    return not getattr(_state, 'suspended', False)
+
+
+def recompute_totals(queryset):
+    """Recompute the stored total and item count of every cart in ``queryset`` with one UPDATE."""
+    return queryset.update(total=total_subquery(), item_count=count_subquery())
+
+
+def apply_item(cart_id, price, sign):
+    # Carts whose total is NULL stay NULL; only the count moves
+    Cart.objects.filter(pk=cart_id).update(
+        total=F('total') + sign * price,
+        item_count=F('item_count') + sign,
+    )
+
+
+def invalidate_for_property(property_id):
+    return Cart.objects.filter(items__property_id=property_id, is_paid=False).update(total=None)
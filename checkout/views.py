@@ -4,17 +4,29 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch
 from .models import Cart, CartItem
 from listings.models import Property
-from .serializers import CartSerializer
+from .serializers import CartBatchSerializer, CartSerializer
+from .totals import per_item_updates_suspended, recompute_totals
+from main_project.db import write_transaction
 from django.views.decorators.csrf import csrf_exempt
 
 
+def carts_with_items():
+    return Cart.objects.prefetch_related(Prefetch('items', queryset=CartItem.objects.select_related('property')))
+
+
 class CartView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    # Queries per request for an existing cart, independent of its size
+    query_budget = {'get': 2}
 
     def get(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart = carts_with_items().filter(user=request.user).first()
+        if cart is None:
+            cart, created = Cart.objects.get_or_create(user=request.user)
         serializer = CartSerializer(cart)
         return Response(serializer.data)
 
@@ -29,7 +41,9 @@ class AddToCartView(APIView):
         if CartItem.objects.filter(cart=cart, property=property_obj).exists():
             return Response({'detail': 'Property already in cart.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        CartItem.objects.create(cart=cart, property=property_obj)
+        # The item and the cart's stored total commit together (checkout.signals)
+        with transaction.atomic():
+            CartItem.objects.create(cart=cart, property=property_obj)
         return Response({'message': 'Property added to cart.'}, status=status.HTTP_201_CREATED)
 
 class RemoveFromCartView(APIView):
@@ -40,17 +54,65 @@ class RemoveFromCartView(APIView):
         cart = get_object_or_404(Cart, user=user)
         property_obj = get_object_or_404(Property, id=property_id)
 
-        try:
-            item = CartItem.objects.get(cart=cart, property=property_obj)
+        with transaction.atomic():
+            try:
+                item = CartItem.objects.get(cart=cart, property=property_obj)
+            except CartItem.DoesNotExist:
+                return Response({'detail': 'Property not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
+            item.property = property_obj
             item.delete()
-        except CartItem.DoesNotExist:
-            return Response({'detail': 'Property not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Delete cart if empty
-        if not cart.items.exists():
-            cart.delete()
+            # Delete cart if empty
+            emptied = Cart.objects.filter(pk=cart.pk, item_count=0).delete()[0]
+        if emptied:
             return Response({'message': 'Property removed. Cart is now empty and deleted.'}, status=status.HTTP_200_OK)
 
         return Response({'message': 'Property removed from cart.'}, status=status.HTTP_200_OK)
 
 
+class CartBatchView(APIView):
+    """Add and/or remove several properties in one request and return the updated cart.
+
+    Ids that can't be added (unknown, unpublished or already in the cart)
+    or removed (not in the cart) are skipped and listed under ``ignored``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # Queries per request for an existing cart that both adds and removes,
+    # independent of how many ids it carries
+    query_budget = {'post': 9}
+
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        to_add, to_remove = set(serializer.validated_data['add']), set(serializer.validated_data['remove'])
+
+        with write_transaction():
+            cart, created = Cart.objects.select_for_update().get_or_create(user=request.user)
+            in_cart = dict(
+                CartItem.objects.filter(cart=cart, property_id__in=to_add | to_remove)
+                .values_list('property_id', 'pk')
+            )
+            addable = set(
+                Property.objects.filter(id__in=to_add - in_cart.keys(), is_active=True, is_published=True)
+                .values_list('id', flat=True)
+            ) if to_add - in_cart.keys() else set()
+            removable = to_remove & in_cart.keys()
+
+            # Set-based changes; the stored total is recomputed once below
+            with per_item_updates_suspended():
+                if addable:
+                    CartItem.objects.bulk_create(
+                        [CartItem(cart=cart, property_id=pk) for pk in sorted(addable)], ignore_conflicts=True
+                    )
+                if removable:
+                    CartItem.objects.filter(pk__in=[in_cart[pk] for pk in removable]).delete()
+            if addable or removable:
+                recompute_totals(Cart.objects.filter(pk=cart.pk))
+
+        data = CartSerializer(carts_with_items().get(pk=cart.pk)).data
+        data['changes'] = {
+            'added': sorted(addable),
+            'removed': sorted(removable),
+            'ignored': sorted((to_add - addable) | (to_remove - removable)),
+        }
+        return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,34 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.functions import Now
+
+from . import cache, clusters, facets
+from .models import Property
+
+# Set-based Property state changes. A queryset.update() skips save() and the
+# Property signals, so these helpers keep the facet counts, map clusters and
+# listing cache in step themselves.
+
+AGGREGATE_COLUMNS = (
+    'property_type', 'country_normalized', 'state_normalized', 'bedroom', 'price',
+    'is_active', 'is_published', 'latitude', 'longitude',
+)
+
+
+def deactivate_properties(queryset):
+    """Take every active property in ``queryset`` off the market with one UPDATE; returns the count."""
+    with transaction.atomic():
+        active = list(queryset.filter(is_active=True).only(*AGGREGATE_COLUMNS))
+        if not active:
+            return 0
+        Property.objects.filter(pk__in=[prop.pk for prop in active]).update(is_active=False, updated_at=Now())
+
+        for key, count in Counter(facets.facet_key(prop) for prop in active).items():
+            facets.apply_delta(key, -count)
+        for prop in active:
+            point = clusters.map_point(prop)
+            if point is not None:
+                clusters.remove_point(point)
+        cache.bump_generation()
+    return len(active)
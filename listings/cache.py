@@ -0,0 +1,140 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from main_project.streaming import wants_stream
+
+# Listing responses are cached under a key that embeds a generation number.
+# Any Property write bumps the generation, so every cached listing response
+# becomes unreachable at once and simply ages out of the cache. The list
+# ETag embeds it too, so a generation must never be handed out twice: when
+# the counter is missing (a fresh or cleared cache) it restarts from the
+# clock rather than from 1.
+
+GENERATION_KEY = 'listings:generation'
+CHANGED_AT_KEY = 'listings:changed_at'
+STATS_KEY = 'listings:cache:{}'
+STATS = ('hit', 'miss', 'bypass')
+
+
+def is_enabled():
+    return getattr(settings, 'LISTINGS_RESPONSE_CACHE', True)
+
+
+def get_timeout():
+    return getattr(settings, 'LISTINGS_RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def incr(key, initial=1):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing key: add() wins the race for the first writer, incr() for everyone else
+        if cache.add(key, initial, timeout=None):
+            return initial
+        return cache.incr(key)
+
+
+def new_generation():
+    return time.time_ns()
+
+
+def current_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        initial = new_generation()
+        cache.add(GENERATION_KEY, initial, timeout=None)
+        generation = cache.get(GENERATION_KEY, initial)
+    return generation
+
+
+def changed_at():
+    """When listing data last changed, as far as the cache knows (for Last-Modified)."""
+    value = cache.get(CHANGED_AT_KEY)
+    if value is None:
+        cache.add(CHANGED_AT_KEY, timezone.now(), timeout=None)
+        value = cache.get(CHANGED_AT_KEY)
+    return value
+
+
+def mark_changed():
+    incr(GENERATION_KEY, initial=new_generation())
+    cache.set(CHANGED_AT_KEY, timezone.now(), timeout=None)
+
+
+def bump_generation():
+    mark_changed()
+    # Bump again once the write is visible to other connections, so a response
+    # built from pre-commit data in the meantime is not served afterwards.
+    transaction.on_commit(mark_changed)
+
+
+def record(outcome):
+    incr(STATS_KEY.format(outcome))
+
+
+def stats():
+    values = cache.get_many([STATS_KEY.format(name) for name in STATS])
+    counters = {name: values.get(STATS_KEY.format(name), 0) for name in STATS}
+    counters['generation'] = current_generation()
+    return counters
+
+
+def visibility_class(user):
+    return 'staff' if user.is_authenticated and user.is_staff else 'public'
+
+
+def canonical_params(query_params):
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(query_params)
+        for value in sorted(query_params.getlist(key))
+    )
+
+
+def response_key(request, namespace, kwargs, per_user):
+    parts = [
+        request.get_host(),
+        visibility_class(request.user),
+        str(request.user.pk) if per_user else '',
+        '&'.join(f'{k}={v}' for k, v in sorted(kwargs.items())),
+        canonical_params(request.query_params),
+    ]
+    digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+    return f'listings:response:{namespace}:{current_generation()}:{digest}'
+
+
+def cache_listing_response(namespace, per_user=False):
+    """Cache successful GET responses of a listing view.
+
+    ``per_user`` adds the user to the key, for views whose result depends on
+    who is asking rather than just on staff vs non-staff.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            no_cache = 'no-cache' in request.headers.get('Cache-Control', '')
+            if not is_enabled() or no_cache or wants_stream(request):
+                record('bypass')
+                return method(view, request, *args, **kwargs)
+
+            key = response_key(request, namespace, kwargs, per_user)
+            cached = cache.get(key)
+            if cached is not None:
+                record('hit')
+                data, status_code = cached
+                return Response(data, status=status_code)
+
+            record('miss')
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, (response.data, response.status_code), get_timeout())
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,187 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Floor, Greatest, Least
+
+from .geo import bbox_cells
+from .models import Property, PropertyMapCell
+
+# Map clusters are read from PropertyMapCell, one row per non-empty grid cell
+# per cluster zoom level. At level z the grid is 2**(z+3) cells around the
+# globe (about eight per 256px map tile), so a zoomed-out viewport reads at
+# most a few hundred small rows instead of every listing inside it.
+
+DEFAULT_CLUSTER_ZOOMS = (0, 2, 4, 6, 8, 10, 12)
+
+
+def cluster_zooms():
+    return tuple(sorted(getattr(settings, 'LISTINGS_CLUSTER_ZOOMS', DEFAULT_CLUSTER_ZOOMS)))
+
+
+def cluster_level(zoom):
+    """The stored level used for a map zoom: the finest one not finer than ``zoom``."""
+    levels = cluster_zooms()
+    return max((level for level in levels if level <= zoom), default=levels[0])
+
+
+def cell_size(zoom):
+    return 360 / 2 ** (zoom + 3)
+
+
+def grid_shape(zoom):
+    cols = 2 ** (zoom + 3)
+    return cols // 2, cols
+
+
+def cell_position(zoom, latitude, longitude):
+    rows, cols = grid_shape(zoom)
+    size = cell_size(zoom)
+    row = min(int((latitude + 90) // size), rows - 1)
+    col = min(int((longitude + 180) // size), cols - 1)
+    return row, col
+
+
+def cell_bounds(zoom, row, col):
+    size = cell_size(zoom)
+    return row * size - 90, col * size - 180, (row + 1) * size - 90, (col + 1) * size - 180
+
+
+def map_point(prop):
+    """(latitude, longitude, price) a property is clustered at, or None when it is not on the map."""
+    if not (prop.is_active and prop.is_published):
+        return None
+    if prop.latitude is None or prop.longitude is None:
+        return None
+    return prop.latitude, prop.longitude, Decimal(prop.price or 0)
+
+
+def properties_in_cell(zoom, row, col):
+    south, west, north, east = cell_bounds(zoom, row, col)
+    rows, cols = grid_shape(zoom)
+    properties = Property.objects.filter(
+        is_active=True, is_published=True,
+        latitude__gte=south, longitude__gte=west,
+    )
+    # Half-open cells, except the last row/column which also owns the edge
+    properties = properties.filter(latitude__lte=north) if row == rows - 1 else properties.filter(latitude__lt=north)
+    properties = properties.filter(longitude__lte=east) if col == cols - 1 else properties.filter(longitude__lt=east)
+    cells = bbox_cells(south, west, north, east)
+    if cells is not None:
+        properties = properties.filter(geo_cell__in=cells)
+    return properties
+
+
+def add_points(points):
+    """Add (latitude, longitude, price) points, one UPDATE per touched cell and level."""
+    cells = {}
+    for zoom in cluster_zooms():
+        for latitude, longitude, price in points:
+            key = (zoom, *cell_position(zoom, latitude, longitude))
+            count, lat_sum, lng_sum, low, high = cells.get(key, (0, 0.0, 0.0, price, price))
+            cells[key] = (count + 1, lat_sum + latitude, lng_sum + longitude, min(low, price), max(high, price))
+
+    with transaction.atomic():
+        for (zoom, row, col), (count, lat_sum, lng_sum, low, high) in cells.items():
+            low_value = Value(low, output_field=DecimalField(max_digits=15, decimal_places=2))
+            high_value = Value(high, output_field=DecimalField(max_digits=15, decimal_places=2))
+            cell, created = PropertyMapCell.objects.get_or_create(zoom=zoom, row=row, col=col)
+            PropertyMapCell.objects.filter(pk=cell.pk).update(
+                count=F('count') + count,
+                latitude_sum=F('latitude_sum') + lat_sum,
+                longitude_sum=F('longitude_sum') + lng_sum,
+                min_price=Coalesce(Least('min_price', low_value), low_value),
+                max_price=Coalesce(Greatest('max_price', high_value), high_value),
+            )
+
+
+def add_point(point):
+    add_points([point])
+
+
+def remove_point(point):
+    latitude, longitude, price = point
+    with transaction.atomic():
+        for zoom in cluster_zooms():
+            row, col = cell_position(zoom, latitude, longitude)
+            cells = PropertyMapCell.objects.filter(zoom=zoom, row=row, col=col)
+            cells.update(
+                count=F('count') - 1,
+                latitude_sum=F('latitude_sum') - latitude,
+                longitude_sum=F('longitude_sum') - longitude,
+            )
+            cell = cells.first()
+            if cell is None:
+                continue
+            # A min/max can't be subtracted, so only when the removed price was
+            # one of the bounds are they recomputed from the cell's properties
+            if cell.min_price is None or not (cell.min_price < price < cell.max_price):
+                bounds = properties_in_cell(zoom, row, col).aggregate(low=Min('price'), high=Max('price'))
+                cells.update(min_price=bounds['low'], max_price=bounds['high'])
+
+
+def move(old_point, new_point):
+    if old_point == new_point:
+        return
+    if old_point is not None:
+        remove_point(old_point)
+    if new_point is not None:
+        add_point(new_point)
+
+
+def rebuild_clusters():
+    public = Property.objects.filter(
+        is_active=True, is_published=True, latitude__isnull=False, longitude__isnull=False,
+    )
+    with transaction.atomic():
+        PropertyMapCell.objects.all().delete()
+        for zoom in cluster_zooms():
+            rows, cols = grid_shape(zoom)
+            size = cell_size(zoom)
+            cells = (
+                public.annotate(
+                    row=Least(Cast(Floor((F('latitude') + 90) / size), IntegerField()), rows - 1),
+                    col=Least(Cast(Floor((F('longitude') + 180) / size), IntegerField()), cols - 1),
+                )
+                .values('row', 'col')
+                .annotate(
+                    count=Count('id'), latitude_sum=Sum('latitude'), longitude_sum=Sum('longitude'),
+                    min_price=Min('price'), max_price=Max('price'),
+                )
+                .order_by()
+            )
+            PropertyMapCell.objects.bulk_create(
+                [PropertyMapCell(zoom=zoom, **cell) for cell in cells.iterator()],
+                batch_size=1000,
+            )
+    return PropertyMapCell.objects.count()
+
+
+def clusters_in_bbox(zoom, south, west, north, east):
+    """Cluster cells of the level for ``zoom`` that intersect the viewport."""
+    zoom = cluster_level(zoom)
+    first_row = cell_position(zoom, south, 0)[0]
+    last_row = cell_position(zoom, north, 0)[0]
+    first_col = cell_position(zoom, 0, west)[1]
+    last_col = cell_position(zoom, 0, east)[1]
+    if west <= east:
+        columns = Q(col__gte=first_col, col__lte=last_col)
+    else:
+        # Viewport crossing the antimeridian
+        columns = Q(col__gte=first_col) | Q(col__lte=last_col)
+    return (
+        PropertyMapCell.objects
+        .filter(columns, zoom=zoom, row__gte=first_row, row__lte=last_row, count__gt=0)
+        .order_by('row', 'col')
+    )
+
+
+def cluster_data(cell):
+    return {
+        'latitude': round(cell.latitude_sum / cell.count, 6),
+        'longitude': round(cell.longitude_sum / cell.count, 6),
+        'count': cell.count,
+        'min_price': cell.min_price,
+        'max_price': cell.max_price,
+    }
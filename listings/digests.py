@@ -0,0 +1,100 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from outbox.mail import queue_mail
+from users.models import Profile
+
+from .models import Enquiry
+
+# Enquiry digests for agents who chose enquiry_emails="digest". Their
+# enquiries are saved without notified_at; send_enquiry_digests collects
+# such enquiries in pages ordered by agent and queues one summary
+# email per agent, at most once per ENQUIRY_DIGEST_WINDOW_MINUTES.
+
+MAX_LISTED = 20
+
+
+def digest_window():
+    return timedelta(minutes=getattr(settings, 'ENQUIRY_DIGEST_WINDOW_MINUTES', 60))
+
+
+def pending_enquiries(now):
+    # Also picks up enquiries left over by an agent who switched back to
+    # immediate emails, so nothing stays unnotified
+    due = Q(property__agent__profile__enquiry_digest_sent_at__isnull=True) | Q(
+        property__agent__profile__enquiry_digest_sent_at__lte=now - digest_window()
+    )
+    return (
+        Enquiry.objects.filter(due, notified_at__isnull=True, created_at__lte=now)
+        .select_related('user', 'property__agent')
+        .order_by('property__agent_id', 'created_at', 'pk')
+    )
+
+
+def pending_by_agent(now, page_size):
+    """Yield ``(agent_id, enquiries)`` for every agent with pending enquiries.
+
+    Rows are read a page at a time, and each page is read in full before
+    the caller writes anything, so no read cursor is open while
+    notified_at is being updated. An agent whose rows may continue past
+    the end of a page is left for the next page. An agent with more
+    pending enquiries than a page holds is read on their own.
+    """
+    last_agent_id = 0
+    while True:
+        rows = list(pending_enquiries(now).filter(property__agent_id__gt=last_agent_id)[:page_size])
+        if not rows:
+            return
+        groups = [(agent_id, list(group)) for agent_id, group in groupby(rows, key=lambda e: e.property.agent_id)]
+        if len(rows) == page_size:
+            if len(groups) > 1:
+                groups.pop()
+            else:
+                agent_id = groups[0][0]
+                groups = [(agent_id, list(pending_enquiries(now).filter(property__agent_id=agent_id)))]
+        yield from groups
+        if len(rows) < page_size:
+            return
+        last_agent_id = groups[-1][0]
+
+
+def describe(count):
+    return f"{count} new enquir{'y' if count == 1 else 'ies'}"
+
+
+def render_digest(agent, enquiries):
+    lines = [f"Hi {agent.first_name},", "", f"You have {describe(len(enquiries))} on your listings:", ""]
+    for enquiry in enquiries[:MAX_LISTED]:
+        message = enquiry.message if len(enquiry.message) <= 200 else enquiry.message[:197] + '...'
+        lines.append(
+            f"- {enquiry.property.title}: {enquiry.user.first_name} {enquiry.user.last_name} "
+            f"({enquiry.user.email})\n  {message}"
+        )
+    if len(enquiries) > MAX_LISTED:
+        lines.append(f"...and {len(enquiries) - MAX_LISTED} more.")
+    lines += ["", "Please log in to your dashboard to reply.", "", "Best regards,\nReal Estate Team"]
+    return '\n'.join(lines)
+
+
+def send_digests(now=None, page_size=500):
+    """Queue one digest email per agent with pending enquiries; returns the number queued."""
+    now = now or timezone.now()
+    sent = 0
+    for agent_id, enquiries in pending_by_agent(now, page_size):
+        agent = enquiries[0].property.agent
+        with transaction.atomic():
+            queue_mail(
+                subject=f"{describe(len(enquiries))} on your listings",
+                message=render_digest(agent, enquiries),
+                from_email=None,
+                recipient_list=[agent.email],
+            )
+            Enquiry.objects.filter(pk__in=[enquiry.pk for enquiry in enquiries]).update(notified_at=now)
+            Profile.objects.filter(user_id=agent_id).update(enquiry_digest_sent_at=now)
+        sent += 1
+    return sent
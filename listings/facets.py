@@ -0,0 +1,166 @@
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Property, PropertyFacetCell
+
+# Country and state values are the casefolded keys the filters match on;
+# each comes with a label, the greatest original spelling, for display.
+# Facet name in the API -> label column on PropertyFacetCell
+LABELS = {
+    'country': 'country_label',
+    'state': 'state_label',
+}
+
+# Facet name in the API -> column on PropertyFacetCell
+FACETS = {
+    'property_type': 'property_type',
+    'country': 'country',
+    'state': 'state',
+    'bedroom': 'bedroom',
+    'price': 'price_bucket',
+}
+
+DEFAULT_PRICE_BUCKETS = [0, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000]
+
+
+def price_boundaries():
+    return list(getattr(settings, 'LISTINGS_PRICE_BUCKETS', DEFAULT_PRICE_BUCKETS))
+
+
+def price_bucket(price):
+    return max(bisect_right(price_boundaries(), Decimal(price or 0)) - 1, 0)
+
+
+def price_bucket_expression():
+    boundaries = price_boundaries()
+    return Case(
+        *[When(price__lt=upper, then=Value(i)) for i, upper in enumerate(boundaries[1:])],
+        default=Value(len(boundaries) - 1),
+        output_field=IntegerField(),
+    )
+
+
+def price_bucket_label(bucket):
+    boundaries = price_boundaries()
+    lower = boundaries[bucket]
+    upper = boundaries[bucket + 1] if bucket + 1 < len(boundaries) else None
+    return {'min': lower, 'max': upper}
+
+
+def facet_key(prop):
+    """The PropertyFacetCell a property is counted in, and its labels, or None when it is not public."""
+    if not (prop.is_active and prop.is_published):
+        return None
+    return (
+        prop.property_type,
+        prop.country_normalized,
+        prop.state_normalized,
+        prop.bedroom,
+        price_bucket(prop.price),
+        prop.country,
+        prop.state,
+    )
+
+
+def apply_delta(key, delta):
+    if key is None or not delta:
+        return
+    property_type, country, state, bedroom, bucket, country_label, state_label = key
+    with transaction.atomic():
+        cell, created = PropertyFacetCell.objects.get_or_create(
+            property_type=property_type, country=country, state=state,
+            bedroom=bedroom, price_bucket=bucket,
+        )
+        changes = {'count': F('count') + delta}
+        if delta > 0:
+            # The same label rebuild_facets would pick
+            changes['country_label'] = Greatest('country_label', Value(country_label))
+            changes['state_label'] = Greatest('state_label', Value(state_label))
+        PropertyFacetCell.objects.filter(pk=cell.pk).update(**changes)
+
+
+def move(old_key, new_key):
+    if old_key == new_key:
+        return
+    apply_delta(old_key, -1)
+    apply_delta(new_key, 1)
+
+
+def rebuild_facets():
+    cells = (
+        Property.objects.filter(is_active=True, is_published=True)
+        .annotate(price_bucket=price_bucket_expression())
+        .values('property_type', 'country_normalized', 'state_normalized', 'bedroom', 'price_bucket')
+        .annotate(count=Count('id'), country_label=Max('country'), state_label=Max('state'))
+        .order_by()
+    )
+    with transaction.atomic():
+        PropertyFacetCell.objects.all().delete()
+        PropertyFacetCell.objects.bulk_create([
+            PropertyFacetCell(
+                property_type=cell['property_type'],
+                country=cell['country_normalized'],
+                state=cell['state_normalized'],
+                country_label=cell['country_label'],
+                state_label=cell['state_label'],
+                bedroom=cell['bedroom'],
+                price_bucket=cell['price_bucket'],
+                count=cell['count'],
+            )
+            for cell in cells.iterator()
+        ], batch_size=1000)
+    return PropertyFacetCell.objects.count()
+
+
+def format_facets(rows_by_facet):
+    facets = {}
+    for name, rows in rows_by_facet.items():
+        values = []
+        for value, count, *label in rows:
+            if not count:
+                continue
+            entry = {'value': value, 'count': count}
+            if label:
+                entry['label'] = label[0]
+            if name == 'price':
+                entry.update(price_bucket_label(value))
+            values.append(entry)
+        facets[name] = values
+    return facets
+
+
+def facet_counts_from_cells(filters):
+    """Facet counts for filters on property_type/country/state, read from PropertyFacetCell."""
+    cells = PropertyFacetCell.objects.filter(count__gt=0, **filters)
+    rows = {}
+    for name, column in FACETS.items():
+        labels = {'label': Max(LABELS[name])} if name in LABELS else {}
+        rows[name] = list(
+            cells.values_list(column).annotate(total=Sum('count'), **labels).order_by(column)
+        )
+    return format_facets(rows)
+
+
+def facet_counts_from_queryset(properties):
+    """Facet counts computed directly over a filtered Property queryset."""
+    columns = {
+        'property_type': 'property_type',
+        'country': 'country_normalized',
+        'state': 'state_normalized',
+        'bedroom': 'bedroom',
+        'price': 'price_bucket',
+    }
+    properties = properties.annotate(price_bucket=price_bucket_expression())
+    rows = {}
+    for name, column in columns.items():
+        # The original spellings are the Property fields named like the facet
+        labels = {'label': Max(name)} if name in LABELS else {}
+        rows[name] = list(
+            properties.values_list(column).annotate(total=Count('id'), **labels).order_by(column)
+        )
+    return format_facets(rows)
@@ -0,0 +1,93 @@
+import math
+
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+# A fixed lat/lng grid stored as one integer per property (row * GRID_COLS + col),
+# so it works on plain SQLite. A viewport becomes an IN list of the cells it
+# covers on the indexed geo_cell column, so a query only visits those cells.
+
+GRID_SIZE = 0.05  # degrees, roughly 5.5 km north-south
+GRID_ROWS = int(180 / GRID_SIZE)
+GRID_COLS = int(360 / GRID_SIZE)
+# Viewports covering more cells than this fall back to a plain lat/lng filter
+MAX_CELLS = 2500
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def grid_position(latitude, longitude):
+    row = min(int((latitude + 90) / GRID_SIZE), GRID_ROWS - 1)
+    col = min(int((longitude + 180) / GRID_SIZE), GRID_COLS - 1)
+    return row, col
+
+
+def grid_cell(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    row, col = grid_position(latitude, longitude)
+    return row * GRID_COLS + col
+
+
+def parse_bbox(value):
+    """Parse "south,west,north,east" into floats; raises ValueError when invalid."""
+    south, west, north, east = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('Invalid bounding box.')
+    return south, west, north, east
+
+
+def column_ranges(west, east):
+    # A viewport crossing the antimeridian (west > east) wraps into two ranges
+    first = grid_position(0, west)[1]
+    last = grid_position(0, east)[1]
+    if west <= east:
+        return [(first, last)]
+    return [(first, GRID_COLS - 1), (0, last)]
+
+
+def bbox_cells(south, west, north, east):
+    rows = range(grid_position(south, 0)[0], grid_position(north, 0)[0] + 1)
+    cols = [col for first, last in column_ranges(west, east) for col in range(first, last + 1)]
+    if len(rows) * len(cols) > MAX_CELLS:
+        return None
+    return [row * GRID_COLS + col for row in rows for col in cols]
+
+
+def within_bbox(queryset, south, west, north, east):
+    cells = bbox_cells(south, west, north, east)
+    if cells is not None:
+        queryset = queryset.filter(geo_cell__in=cells)
+
+    queryset = queryset.filter(latitude__gte=south, latitude__lte=north)
+    if west <= east:
+        return queryset.filter(longitude__gte=west, longitude__lte=east)
+    return queryset.filter(Q(longitude__gte=west) | Q(longitude__lte=east))
+
+
+def distance_expression(latitude, longitude):
+    # Haversine distance in km from (latitude, longitude) to each row
+    dlat = Radians(F('latitude') - latitude) / 2
+    dlng = Radians(F('longitude') - longitude) / 2
+    a = Power(Sin(dlat), 2) + math.cos(math.radians(latitude)) * Cos(Radians(F('latitude'))) * Power(Sin(dlng), 2)
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Rows within ``radius_km`` of the point, annotated with ``distance_km``, nearest first."""
+    lat_delta = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lng_delta = min(radius_km / (KM_PER_DEGREE * cos_lat), 180)
+
+    south, north = max(latitude - lat_delta, -90), min(latitude + lat_delta, 90)
+    west, east = longitude - lng_delta, longitude + lng_delta
+    if lng_delta >= 180:
+        west, east = -180, 180
+    else:
+        west = west + 360 if west < -180 else west
+        east = east - 360 if east > 180 else east
+
+    queryset = within_bbox(queryset, south, west, north, east)
+    return queryset.annotate(distance_km=distance_expression(latitude, longitude)).filter(
+        distance_km__lte=radius_km
+    ).order_by('distance_km', 'pk')
@@ -0,0 +1,136 @@
+import codecs
+import csv
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from . import cache, clusters, facets
+from .models import Property
+from .search import index_properties
+from .serializers import PropertySerializer
+
+# Bulk listing import. Rows are read one at a time from the uploaded file,
+# validated with PropertySerializer and inserted with bulk_create, one
+# transaction per batch. Only the current batch and the (capped) error list
+# are held in memory, so file size does not matter.
+#
+# bulk_create skips Property.save() and its signals, so each batch does the
+# same bookkeeping itself: derived columns, search index, facet and map
+# cluster counts, and the listing cache generation.
+
+FORMATS = {'csv', 'jsonl'}
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def batch_size():
+    return getattr(settings, 'LISTINGS_IMPORT_BATCH_SIZE', 500)
+
+
+def max_errors():
+    return getattr(settings, 'LISTINGS_IMPORT_MAX_ERRORS', 1000)
+
+
+def detect_format(filename, requested=None):
+    if requested:
+        if requested not in FORMATS:
+            raise ImportFormatError(f'Unsupported format {requested!r}; use csv or jsonl.')
+        return requested
+    for extension, fmt in EXTENSIONS.items():
+        if (filename or '').lower().endswith(extension):
+            return fmt
+    raise ImportFormatError('Cannot tell the file format; pass format=csv or format=jsonl.')
+
+
+def clean_row(row):
+    # Empty cells mean "not provided", so model defaults and null apply
+    return {
+        key.strip(): value for key, value in row.items()
+        if key is not None and value not in ('', None)
+    }
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line, row, error)`` for each record of a binary CSV or JSONL stream."""
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(lines)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as exc:
+                    yield reader.line_num, None, {'non_field_errors': [str(exc)]}
+                    continue
+                yield reader.line_num, clean_row(row), None
+        else:
+            for line, text in enumerate(lines, start=1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError as exc:
+                    yield line, None, {'non_field_errors': [f'Invalid JSON: {exc}']}
+                    continue
+                if not isinstance(row, dict):
+                    yield line, None, {'non_field_errors': ['Each line must be a JSON object.']}
+                    continue
+                yield line, clean_row(row), None
+    except UnicodeDecodeError:
+        raise ImportFormatError('The file is not valid UTF-8.')
+
+
+def insert_batch(batch):
+    with transaction.atomic():
+        created = Property.objects.bulk_create(batch)
+        index_properties(created)
+        for key, count in Counter(facets.facet_key(prop) for prop in created).items():
+            facets.apply_delta(key, count)
+        points = [point for point in map(clusters.map_point, created) if point is not None]
+        if points:
+            clusters.add_points(points)
+        cache.bump_generation()
+    return len(created)
+
+
+def import_properties(stream, fmt, agent, size=None):
+    """Import listings for ``agent`` from a binary CSV/JSONL stream and return a report.
+
+    Rows that fail validation are reported with their line number and
+    serializer errors; valid rows are still imported.
+    """
+    size = size or batch_size()
+    report = {'created': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    batch = []
+
+    for line, row, errors in read_rows(stream, fmt):
+        if errors is None:
+            serializer = PropertySerializer(data=row)
+            if serializer.is_valid():
+                prop = Property(**serializer.validated_data, agent=agent, user=agent)
+                prop.set_derived_fields()
+                batch.append(prop)
+            else:
+                errors = serializer.errors
+
+        if errors is not None:
+            report['failed'] += 1
+            if len(report['errors']) < max_errors():
+                report['errors'].append({'line': line, 'errors': errors})
+            else:
+                report['errors_truncated'] = True
+
+        if len(batch) >= size:
+            report['created'] += insert_batch(batch)
+            batch = []
+
+    if batch:
+        report['created'] += insert_batch(batch)
+    return report
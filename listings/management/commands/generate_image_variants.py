@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from listings.models import PropertyImage
+from main_project.images import generate_variants, image_fields, pending_fields
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for property and profile images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that already exist.")
+
+    def handle(self, *args, **options):
+        for model in (PropertyImage, Profile):
+            done = 0
+            for instance in model.objects.order_by('pk').iterator(chunk_size=200):
+                if options['force']:
+                    fields = [f.name for f in image_fields(instance) if getattr(instance, f.name).name]
+                else:
+                    fields = pending_fields(instance)
+                if fields:
+                    generate_variants(model, instance.pk, fields)
+                    done += 1
+            self.stdout.write(f"{model.__name__}: generated variants for {done} rows.")
+        self.stdout.write(self.style.SUCCESS("Done."))
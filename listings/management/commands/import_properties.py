@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from listings.imports import ImportFormatError, detect_format, import_properties
+
+
+class Command(BaseCommand):
+    help = "Bulk import listings for an agent from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file with one listing per row.")
+        parser.add_argument('--agent', required=True, help="Email of the agent the listings belong to.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="File format; defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, help="Rows per INSERT batch.")
+
+    def handle(self, *args, **options):
+        agent = get_user_model().objects.filter(email=options['agent']).first()
+        if agent is None:
+            raise CommandError(f"No user with email {options['agent']}.")
+
+        try:
+            fmt = detect_format(options['path'], options['format'])
+            with open(options['path'], 'rb') as stream:
+                report = import_properties(stream, fmt, agent, size=options['batch_size'])
+        except (ImportFormatError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"line {error['line']}: {dict(error['errors'])}")
+        if report['errors_truncated']:
+            self.stderr.write("More errors were not reported.")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['created']} listings, {report['failed']} rows failed."))
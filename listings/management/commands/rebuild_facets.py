@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from listings.facets import rebuild_facets
+
+
+class Command(BaseCommand):
+    help = "Rebuild the property facet count table from the Property table."
+
+    def handle(self, *args, **options):
+        cells = rebuild_facets()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} facet cells."))
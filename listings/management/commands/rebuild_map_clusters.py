@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from listings.clusters import rebuild_clusters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the map cluster aggregates from the Property table."
+
+    def handle(self, *args, **options):
+        cells = rebuild_clusters()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {cells} map cluster cells."))
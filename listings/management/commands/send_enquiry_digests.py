@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from listings.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = "Queue one summary email per agent for enquiries waiting on a digest."
+
+    def handle(self, *args, **options):
+        sent = send_digests()
+        self.stdout.write(self.style.SUCCESS(f"Queued {sent} enquiry digests."))
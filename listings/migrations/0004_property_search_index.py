@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# The SQL is copied here rather than imported from listings.search, so later
+# changes to that module can't change what this migration does.
+
+FTS_TABLE = "listings_property_fts"
+PG_INDEX_NAME = "listings_property_search_gin"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, description, location, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f"DELETE FROM {FTS_TABLE}")
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description, location) "
+            f"SELECT id, title, description, location FROM listings_property"
+        )
+    elif vendor == "postgresql":
+        # The expression Django generates for SearchVector("title",
+        # "description", "location", config="english"), which the search
+        # queries use
+        schema_editor.execute(
+            f'CREATE INDEX "{PG_INDEX_NAME}" ON "listings_property" USING gin '
+            f"((to_tsvector('english'::regconfig, "
+            f"""COALESCE("title", '') || ' ' || COALESCE("description", '') || ' ' || COALESCE("location", ''))))"""
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {PG_INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0003_property_image1_property_image2_property_image3_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
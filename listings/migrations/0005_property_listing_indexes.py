@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 20:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0004_property_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_published", True)),
+                fields=["created_at", "id"],
+                name="property_public_recent_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_published", True)),
+                fields=["property_type", "created_at", "id"],
+                name="property_public_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_published", True)),
+                fields=["price"],
+                name="property_public_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["agent", "created_at"],
+                name="property_agent_active_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 20:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_normalized_location(apps, schema_editor):
+    Property = apps.get_model("listings", "Property")
+    batch = []
+    for prop in Property.objects.only("id", "country", "state").iterator(chunk_size=1000):
+        prop.country_normalized = (prop.country or "").casefold()
+        prop.state_normalized = (prop.state or "").casefold()
+        batch.append(prop)
+        if len(batch) >= 1000:
+            Property.objects.bulk_update(batch, ["country_normalized", "state_normalized"])
+            batch = []
+    if batch:
+        Property.objects.bulk_update(batch, ["country_normalized", "state_normalized"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0005_property_listing_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="country_normalized",
+            field=models.CharField(default="", editable=False, max_length=90),
+        ),
+        migrations.AddField(
+            model_name="property",
+            name="state_normalized",
+            field=models.CharField(default="", editable=False, max_length=90),
+        ),
+        migrations.RunPython(backfill_normalized_location, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_published", True)),
+                fields=["country_normalized", "state_normalized", "created_at", "id"],
+                name="property_public_location_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_published", True)),
+                fields=["state_normalized", "created_at", "id"],
+                name="property_public_state_idx",
+            ),
+        ),
+    ]
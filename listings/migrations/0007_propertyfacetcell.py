@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0006_property_normalized_location"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertyFacetCell",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "property_type",
+                    models.CharField(
+                        choices=[("SELL", "For Sale"), ("RENT", "For Rent")],
+                        max_length=10,
+                    ),
+                ),
+                ("country", models.CharField(max_length=90)),
+                ("state", models.CharField(max_length=90)),
+                ("bedroom", models.PositiveIntegerField()),
+                ("price_bucket", models.PositiveSmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {
+                    ("property_type", "country", "state", "bedroom", "price_bucket")
+                },
+            },
+        ),
+    ]
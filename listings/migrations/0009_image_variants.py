@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0008_property_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 20:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0010_property_coordinates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertyMapCell",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("zoom", models.PositiveSmallIntegerField()),
+                ("row", models.IntegerField()),
+                ("col", models.IntegerField()),
+                ("count", models.IntegerField(default=0)),
+                ("latitude_sum", models.FloatField(default=0)),
+                ("longitude_sum", models.FloatField(default=0)),
+                (
+                    "min_price",
+                    models.DecimalField(decimal_places=2, max_digits=15, null=True),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(decimal_places=2, max_digits=15, null=True),
+                ),
+            ],
+            options={
+                "unique_together": {("zoom", "row", "col")},
+            },
+        ),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 5.2 on 2026-10-18 20:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+IMAGE_FIELDS = ["main_image", "image1", "image2", "image3", "image4"]
+PLACEHOLDER = "image here"
+
+
+def copy_images_to_table(apps, schema_editor):
+    Property = apps.get_model("listings", "Property")
+    PropertyImage = apps.get_model("listings", "PropertyImage")
+    batch = []
+    for prop in Property.objects.only("id", "image_variants", *IMAGE_FIELDS).iterator(chunk_size=1000):
+        variants = prop.image_variants or {}
+        for position, field in enumerate(IMAGE_FIELDS):
+            name = getattr(prop, field).name
+            if not name or name == PLACEHOLDER:
+                continue
+            # Variants keep pointing at the same files, now under the "image" field
+            entry = variants.get(field)
+            batch.append(PropertyImage(
+                property_id=prop.pk, image=name, position=position,
+                image_variants={"image": entry} if entry else {},
+            ))
+        if len(batch) >= 1000:
+            PropertyImage.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        PropertyImage.objects.bulk_create(batch)
+
+
+def copy_images_to_columns(apps, schema_editor):
+    Property = apps.get_model("listings", "Property")
+    PropertyImage = apps.get_model("listings", "PropertyImage")
+    images = {}
+    for image in PropertyImage.objects.order_by("property_id", "position", "id").iterator(chunk_size=1000):
+        images.setdefault(image.property_id, []).append(image)
+    for prop in Property.objects.filter(pk__in=images):
+        variants = {}
+        for field, image in zip(IMAGE_FIELDS, images[prop.pk]):
+            setattr(prop, field, image.image.name)
+            if image.image_variants.get("image"):
+                variants[field] = image.image_variants["image"]
+        prop.image_variants = variants
+        prop.save(update_fields=[*IMAGE_FIELDS, "image_variants"])
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0011_propertymapcell"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertyImage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("image", models.ImageField(upload_to="properties/")),
+                ("position", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "width",
+                    models.PositiveIntegerField(blank=True, editable=False, null=True),
+                ),
+                (
+                    "height",
+                    models.PositiveIntegerField(blank=True, editable=False, null=True),
+                ),
+                (
+                    "image_variants",
+                    models.JSONField(blank=True, default=dict, editable=False),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "property",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="images",
+                        to="listings.property",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["position", "id"],
+                "indexes": [
+                    models.Index(
+                        fields=["property", "position", "id"],
+                        name="property_image_order_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(copy_images_to_table, copy_images_to_columns),
+        migrations.RemoveField(
+            model_name="property",
+            name="image1",
+        ),
+        migrations.RemoveField(
+            model_name="property",
+            name="image2",
+        ),
+        migrations.RemoveField(
+            model_name="property",
+            name="image3",
+        ),
+        migrations.RemoveField(
+            model_name="property",
+            name="image4",
+        ),
+        migrations.RemoveField(
+            model_name="property",
+            name="image_variants",
+        ),
+        migrations.RemoveField(
+            model_name="property",
+            name="main_image",
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 20:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_enquiries_notified(apps, schema_editor):
+    # Every existing enquiry was emailed when it was made
+    Enquiry = apps.get_model("listings", "Enquiry")
+    Enquiry.objects.filter(notified_at__isnull=True).update(notified_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0012_propertyimage"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="enquiry",
+            name="notified_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_enquiries_notified, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="enquiry",
+            index=models.Index(
+                condition=models.Q(("notified_at__isnull", True)),
+                fields=["created_at"],
+                name="enquiry_unnotified_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 21:16
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_labels(apps, schema_editor):
+    Property = apps.get_model('listings', 'Property')
+    PropertyFacetCell = apps.get_model('listings', 'PropertyFacetCell')
+    for field in ('country', 'state'):
+        spelling = (
+            Property.objects.filter(**{f'{field}_normalized': OuterRef(field)})
+            .values(f'{field}_normalized').annotate(label=Max(field)).values('label')
+        )
+        PropertyFacetCell.objects.update(**{f'{field}_label': Coalesce(Subquery(spelling[:1]), Value(''))})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("listings", "0013_enquiry_notified_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="propertyfacetcell",
+            name="country_label",
+            field=models.CharField(blank=True, max_length=90),
+        ),
+        migrations.AddField(
+            model_name="propertyfacetcell",
+            name="state_label",
+            field=models.CharField(blank=True, max_length=90),
+        ),
+        migrations.RunPython(fill_labels, migrations.RunPython.noop),
+    ]
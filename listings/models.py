@@ -1,11 +1,19 @@
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from .geo import grid_cell
+
 CATEGORIES = (
     ('SELL', 'For Sale'),
     ('RENT', 'For Rent'),
 )
 
+def normalize_location(value):
+    # Case-insensitive equality on country/state becomes plain equality on the
+    # normalized columns, which unlike iexact can use an index.
+    return (value or '').casefold()
+
 class Property(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='properties_uploaded')
     agent = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='properties_assigned')
@@ -15,24 +23,121 @@ class Property(models.Model):
     state = models.CharField(max_length=30)
     country = models.CharField(max_length=30)
     location = models.CharField(max_length=300)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
     bathroom = models.PositiveIntegerField()
     bedroom = models.PositiveIntegerField()
-    main_image = models.ImageField(upload_to='properties/', blank=False, null=False, default='image here')
-    image1 = models.ImageField(upload_to='properties/', blank=True, null=True)
-    image2 = models.ImageField(upload_to='properties/', blank=True, null=True)
-    image3 = models.ImageField(upload_to='properties/', blank=True, null=True)
-    image4 = models.ImageField(upload_to='properties/', blank=True, null=True)
     size = models.PositiveIntegerField(help_text="Size in square meters")
     is_published = models.BooleanField(default=False)
     price = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    country_normalized = models.CharField(max_length=90, default='', editable=False)
+    state_normalized = models.CharField(max_length=90, default='', editable=False)
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # Built around the query shapes in PropertyView (active + published,
+        # newest first, optionally narrowed by category or price) and
+        # MyPropertiesView (one agent's active listings, newest first).
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(is_active=True, is_published=True),
+                name='property_public_recent_idx',
+            ),
+            models.Index(
+                fields=['property_type', 'created_at', 'id'],
+                condition=models.Q(is_active=True, is_published=True),
+                name='property_public_type_idx',
+            ),
+            models.Index(
+                fields=['country_normalized', 'state_normalized', 'created_at', 'id'],
+                condition=models.Q(is_active=True, is_published=True),
+                name='property_public_location_idx',
+            ),
+            models.Index(
+                fields=['state_normalized', 'created_at', 'id'],
+                condition=models.Q(is_active=True, is_published=True),
+                name='property_public_state_idx',
+            ),
+            models.Index(
+                fields=['price'],
+                condition=models.Q(is_active=True, is_published=True),
+                name='property_public_price_idx',
+            ),
+            models.Index(
+                fields=['geo_cell'],
+                condition=models.Q(is_active=True, is_published=True),
+                name='property_public_geo_idx',
+            ),
+            models.Index(
+                fields=['agent', 'created_at'],
+                condition=models.Q(is_active=True),
+                name='property_agent_active_idx',
+            ),
+        ]
+
+    def set_derived_fields(self):
+        # Columns computed from others; save() sets them, bulk_create callers must
+        self.country_normalized = normalize_location(self.country)
+        self.state_normalized = normalize_location(self.state)
+        self.geo_cell = grid_cell(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'country' in update_fields:
+                update_fields.add('country_normalized')
+            if 'state' in update_fields:
+                update_fields.add('state_normalized')
+            if 'latitude' in update_fields or 'longitude' in update_fields:
+                update_fields.add('geo_cell')
+            update_fields.add('updated_at')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
+    @property
+    def cover_image(self):
+        # The first gallery image, from the cover_images or images prefetch when present
+        if 'cover_images' in self.__dict__:
+            images = self.cover_images
+        else:
+            images = self.images.all()[:1]
+        return images[0] if images else None
 
     def __str__(self):
         return self.title
     def __str__(self):
         return self.agent.first_name
 
+class PropertyImage(models.Model):
+    # A property's gallery, in display order; the lowest position is the cover.
+    # width/height and image_variants are filled in by the variant pipeline.
+    property = models.ForeignKey('Property', on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='properties/')
+    position = models.PositiveSmallIntegerField(default=0)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['position', 'id']
+        indexes = [
+            models.Index(fields=['property', 'position', 'id'], name='property_image_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.property_id} #{self.position}: {self.image.name}"
+
 class Enquiry(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enquiries')
     property = models.ForeignKey('Property', on_delete=models.CASCADE, related_name='enquiries')
@@ -40,6 +145,57 @@ class Enquiry(models.Model):
     reply = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     replied_at = models.DateTimeField(null=True, blank=True)
+    # When the agent was told about it; enquiries still NULL here wait for a digest
+    notified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(notified_at__isnull=True),
+                name='enquiry_unnotified_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Enquiry by {self.user.email} on {self.property.title}"
+
+class PropertyFacetCell(models.Model):
+    # Count of public (active + published) properties per combination of facet
+    # values. Maintained incrementally from Property signals, so facet counts
+    # are a small GROUP BY over this table instead of over Property.
+    property_type = models.CharField(choices=CATEGORIES, max_length=10)
+    country = models.CharField(max_length=90)
+    state = models.CharField(max_length=90)
+    # country/state are the casefolded keys; these are a spelling to show
+    country_label = models.CharField(max_length=90, blank=True)
+    state_label = models.CharField(max_length=90, blank=True)
+    bedroom = models.PositiveIntegerField()
+    price_bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['property_type', 'country', 'state', 'bedroom', 'price_bucket']
+
+    def __str__(self):
+        return f"{self.property_type}/{self.country}/{self.state}/{self.bedroom}/{self.price_bucket}: {self.count}"
+
+
+class PropertyMapCell(models.Model):
+    # Map cluster aggregates: public properties with coordinates, grouped per
+    # zoom level into a grid cell (row, col). Maintained incrementally from
+    # Property signals, so a zoomed-out map reads one row per visible cell.
+    zoom = models.PositiveSmallIntegerField()
+    row = models.IntegerField()
+    col = models.IntegerField()
+    count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+    min_price = models.DecimalField(max_digits=15, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=15, decimal_places=2, null=True)
+
+    class Meta:
+        unique_together = ['zoom', 'row', 'col']
+
+    def __str__(self):
+        return f"z{self.zoom}/{self.row}/{self.col}: {self.count}"
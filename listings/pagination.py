@@ -0,0 +1,134 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Newest first, with id as the tie-breaker so the ordering is total.
+    # Pages are fetched with a (created_at, id) range filter instead of OFFSET,
+    # so page 500 costs the same as page 1. Every ordering field is descending;
+    # search results put search_rank in front of the default ordering.
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor.'
+    ordering = ('created_at', 'pk')
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def get_page_size(self, request):
+        default = getattr(settings, 'LISTINGS_PAGE_SIZE', 20)
+        maximum = getattr(settings, 'LISTINGS_MAX_PAGE_SIZE', 100)
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            return default
+        if size < 1:
+            return default
+        return min(size, maximum)
+
+    def encode_cursor(self, obj, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        payload = {'v': values, 'r': int(reverse)}
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode())
+
+    @staticmethod
+    def parse_value(field, value):
+        # Cursors come from clients, so every value is checked against the
+        # type of its ordering column; anything else raises ValueError
+        if field == 'created_at':
+            parsed = parse_datetime(value) if isinstance(value, str) else None
+            if parsed is None or timezone.is_naive(parsed):
+                raise ValueError(value)
+            return parsed
+        if isinstance(value, bool):
+            raise ValueError(value)
+        if field == 'pk' and isinstance(value, int):
+            return value
+        if field == 'search_rank' and isinstance(value, (int, float)):
+            return value
+        raise ValueError(value)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            raw_values, reverse = payload['v'], payload.get('r', 0)
+            if not isinstance(raw_values, list) or len(raw_values) != len(self.ordering) or reverse not in (0, 1):
+                raise ValueError(payload)
+            values = [self.parse_value(field, value) for field, value in zip(self.ordering, raw_values)]
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, bool(reverse)
+
+    def keyset_filter(self, values, reverse):
+        # (a, b, c) < (x, y, z)  ==  a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)
+        lookup = 'gt' if reverse else 'lt'
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            equal = {f: v for f, v in zip(self.ordering[:i], values[:i])}
+            condition |= Q(**equal, **{f'{field}__{lookup}': values[i]})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.cursor_query_param)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[1])
+
+        if cursor:
+            queryset = queryset.filter(self.keyset_filter(*cursor))
+
+        if reverse:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*(f'-{field}' for field in self.ordering))
+
+        # Fetch one extra row to find out whether there is another page.
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,115 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from . import cache
+
+# Full-text search over Property title, description and location.
+# SQLite keeps a standalone FTS5 table keyed by the property id, maintained from
+# the post_save/post_delete signals. Postgres uses a GIN index over the same
+# tsvector expression the queries use, so it needs no extra bookkeeping.
+
+FTS_TABLE = 'listings_property_fts'
+SEARCH_FIELDS = ('title', 'description', 'location')
+# bm25 column weights, in SEARCH_FIELDS order: a title hit beats a location hit
+# beats a description hit.
+FTS_WEIGHTS = (10.0, 1.0, 5.0)
+PG_CONFIG = 'english'
+PG_INDEX_NAME = 'listings_property_search_gin'
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def uses_fts(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def pg_search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector(*SEARCH_FIELDS, config=PG_CONFIG)
+
+
+def search_properties(queryset, text):
+    """Restrict ``queryset`` to properties matching ``text`` and annotate ``search_rank``.
+
+    Every word is matched as a prefix, so "apar lek" finds "Apartment in Lekki".
+    A higher ``search_rank`` is a better match.
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {queryset.model._meta.db_table}.id',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(' & '.join(f'{token}:*' for token in tokens), search_type='raw', config=PG_CONFIG)
+        vector = pg_search_vector()
+        return queryset.alias(search_vector=vector).filter(search_vector=query).annotate(
+            search_rank=SearchRank(vector, query, output_field=FloatField()),
+        )
+
+    # No full-text support on this backend: fall back to substring matching
+    condition = Q()
+    for token in tokens:
+        condition &= Q(title__icontains=token) | Q(description__icontains=token) | Q(location__icontains=token)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def index_property(instance, using='default'):
+    if not uses_fts(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [instance.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) VALUES (%s, %s, %s, %s)',
+            [instance.pk, instance.title, instance.description, instance.location],
+        )
+
+
+def index_properties(instances, using='default'):
+    """Index newly inserted properties in one statement, e.g. after bulk_create."""
+    if not uses_fts(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) VALUES (%s, %s, %s, %s)',
+            [(instance.pk, instance.title, instance.description, instance.location) for instance in instances],
+        )
+
+
+def unindex_property(pk, using='default'):
+    if not uses_fts(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index(using='default'):
+    if not uses_fts(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description, location) '
+            f'SELECT id, title, description, location FROM listings_property'
+        )
+    # Cached search responses were built from the old index
+    cache.bump_generation()
@@ -1,29 +1,176 @@
+from django.db.models import Max, Prefetch
 from rest_framework import serializers
 from .models import *
-        
+from main_project.images import variant_urls
+
+# Upload slots kept from the fixed image columns: main_image is position 0
+# (the cover), image1..image4 positions 1-4. upload_images appends any number.
+IMAGE_SLOTS = {'main_image': 0, 'image1': 1, 'image2': 2, 'image3': 3, 'image4': 4}
+
+
+class CoverImageField(serializers.ImageField):
+    """Accepts an upload for the cover slot and reads back the current cover image."""
+
+    def get_attribute(self, instance):
+        cover = instance.cover_image
+        return cover.image if cover else None
+
+
+class PropertyImageSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PropertyImage
+        fields = ['id', 'image', 'position', 'width', 'height', 'image_variants']
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj, self.context.get('request')).get('image', {})
+
+
 class PropertySerializer(serializers.ModelSerializer):
     agent_name = serializers.SerializerMethodField()
     agent_phoneNumber = serializers.SerializerMethodField()
+    main_image = CoverImageField(required=False)
+    image1 = serializers.ImageField(write_only=True, required=False)
+    image2 = serializers.ImageField(write_only=True, required=False)
+    image3 = serializers.ImageField(write_only=True, required=False)
+    image4 = serializers.ImageField(write_only=True, required=False)
+    upload_images = serializers.ListField(child=serializers.ImageField(), write_only=True, required=False)
+    image_variants = serializers.SerializerMethodField()
     class Meta:
         model = Property
         fields = [
             'id',  'agent_name','agent_phoneNumber', 'title', 'property_type', 'description', 'state',
-            'country', 'location', 'bathroom', 'bedroom', 'size', 'is_published',
+            'country', 'location', 'latitude', 'longitude', 'bathroom', 'bedroom', 'size', 'is_published',
             'price', 'is_active', 'created_at', 'main_image', 'image1', 'image2', 'image3', 'image4',
+            'upload_images', 'image_variants',
         ]
         read_only_fields = ['id', 'is_active', 'created_at', 'user', 'agent']
 
+    # Columns each computed field reads; model fields read their own column.
+    # Image fields read PropertyImage rows through a prefetch instead.
+    field_columns = {
+        'agent_name': ['agent__first_name', 'agent__last_name'],
+        'agent_phoneNumber': ['agent__profile__phone_number'],
+        'main_image': [],
+        'image1': [], 'image2': [], 'image3': [], 'image4': [],
+        'upload_images': [],
+        'image_variants': [],
+    }
+    image_fields = {'main_image', 'image_variants'}
+    # List views load only each property's cover; the detail serializer loads the gallery
+    gallery = False
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        # Sparse fieldsets: ?fields=id,title,price or ?omit=description.
+        # Unknown names are ignored; None means every field.
+        params = request.query_params
+        if not params.get('fields') and not params.get('omit'):
+            return None
+        fields = list(cls.Meta.fields)
+        if params.get('fields'):
+            wanted = {name.strip() for name in params['fields'].split(',')}
+            fields = [name for name in fields if name in wanted]
+        if params.get('omit'):
+            omitted = {name.strip() for name in params['omit'].split(',')}
+            fields = [name for name in fields if name not in omitted]
+        return fields or ['id']
+
+    @classmethod
+    def prefetch_images(cls, queryset, fields=None):
+        if fields is not None and not (cls.image_fields & set(fields)):
+            return queryset
+        if cls.gallery:
+            return queryset.prefetch_related('images')
+        # One query for the whole page: the first image of each property
+        covers = PropertyImage.objects.order_by('position', 'id')[:1]
+        return queryset.prefetch_related(Prefetch('images', queryset=covers, to_attr='cover_images'))
+
+    @classmethod
+    def optimize_queryset(cls, queryset, fields=None):
+        # Load only the columns (and joins) the requested fields need.
+        # created_at is always kept because the keyset cursor is built from it.
+        queryset = cls.prefetch_images(queryset, fields)
+        if fields is None:
+            return queryset.select_related('agent__profile')
+        columns = {'id', 'created_at'}
+        for name in fields:
+            columns.update(cls.field_columns.get(name, [name]))
+        if any(column.startswith('agent__profile__') for column in columns):
+            queryset = queryset.select_related('agent__profile')
+        elif any(column.startswith('agent__') for column in columns):
+            queryset = queryset.select_related('agent')
+        return queryset.only(*columns)
+
     def get_agent_name(self, obj):
         return f"{obj.agent.first_name} {obj.agent.last_name}"
     def get_agent_phoneNumber(self, obj):
         return obj.agent.profile.phone_number or ""
+    def get_image_variants(self, obj):
+        cover = obj.cover_image
+        urls = variant_urls(cover, self.context.get('request')).get('image') if cover else None
+        return {'main_image': urls} if urls else {}
+
+
+    def validate(self, data):
+        latitude = data.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = data.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError('Latitude and longitude must be provided together')
+        return data
 
+    def pop_images(self, validated_data):
+        slots = {
+            IMAGE_SLOTS[name]: validated_data.pop(name)
+            for name in list(validated_data) if name in IMAGE_SLOTS
+        }
+        return slots, validated_data.pop('upload_images', [])
+
+    def save_images(self, property, slots, uploads):
+        for position, image in slots.items():
+            PropertyImage.objects.update_or_create(property=property, position=position, defaults={'image': image})
+        if uploads:
+            last = property.images.aggregate(last=Max('position'))['last']
+            start = len(IMAGE_SLOTS) if last is None else max(last + 1, len(IMAGE_SLOTS))
+            for offset, image in enumerate(uploads):
+                PropertyImage.objects.create(property=property, image=image, position=start + offset)
+        if slots or uploads:
+            # Drop any prefetched images so the response shows the new ones
+            property.__dict__.pop('cover_images', None)
+            getattr(property, '_prefetched_objects_cache', {}).pop('images', None)
 
     def create(self, validated_data):
         request = self.context['request']
         validated_data['agent'] = request.user
         validated_data['user'] = request.user
-        return Property.objects.create(**validated_data)
+        slots, uploads = self.pop_images(validated_data)
+        property = Property.objects.create(**validated_data)
+        self.save_images(property, slots, uploads)
+        return property
+
+    def update(self, instance, validated_data):
+        slots, uploads = self.pop_images(validated_data)
+        instance = super().update(instance, validated_data)
+        self.save_images(instance, slots, uploads)
+        return instance
+
+
+class PropertyDetailSerializer(PropertySerializer):
+    images = PropertyImageSerializer(many=True, read_only=True)
+
+    class Meta(PropertySerializer.Meta):
+        fields = PropertySerializer.Meta.fields + ['images']
+
+    field_columns = {**PropertySerializer.field_columns, 'images': []}
+    image_fields = PropertySerializer.image_fields | {'images'}
+    gallery = True
 
 class EnquirySerializer(serializers.ModelSerializer):
     class Meta:
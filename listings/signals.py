@@ -0,0 +1,129 @@
+from django.contrib.auth.models import User
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from main_project.images import schedule_variants, variants_ready
+from users.models import Profile
+
+from . import cache, clusters, facets
+from .models import Property, PropertyImage
+from .search import index_property, unindex_property
+
+
+@receiver(post_save, sender=Property)
+def update_search_index(sender, instance, using='default', **kwargs):
+    index_property(instance, using=using)
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_search_index(sender, instance, using='default', **kwargs):
+    unindex_property(instance.pk, using=using)
+
+
+@receiver(pre_save, sender=Property)
+def remember_aggregate_keys(sender, instance, raw=False, **kwargs):
+    # Where the stored row is counted before this save, for the facet and map
+    # cluster receivers below to move it from (and its price, for cart totals)
+    instance._facet_key_before = None
+    instance._map_point_before = None
+    instance._price_before = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Property.objects.filter(pk=instance.pk)
+        .only('property_type', 'country_normalized', 'state_normalized', 'bedroom', 'price',
+              'is_active', 'is_published', 'latitude', 'longitude')
+        .first()
+    )
+    if previous is not None:
+        instance._facet_key_before = facets.facet_key(previous)
+        instance._map_point_before = clusters.map_point(previous)
+        instance._price_before = previous.price
+
+
+@receiver(post_save, sender=Property)
+def update_facet_counts(sender, instance, raw=False, **kwargs):
+    if not raw:
+        facets.move(getattr(instance, '_facet_key_before', None), facets.facet_key(instance))
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_facet_counts(sender, instance, **kwargs):
+    facets.apply_delta(facets.facet_key(instance), -1)
+
+
+@receiver(post_save, sender=Property)
+def update_map_clusters(sender, instance, raw=False, **kwargs):
+    if not raw:
+        clusters.move(getattr(instance, '_map_point_before', None), clusters.map_point(instance))
+
+
+@receiver(post_delete, sender=Property)
+def remove_from_map_clusters(sender, instance, **kwargs):
+    clusters.move(clusters.map_point(instance), None)
+
+
+@receiver(post_save, sender=Property)
+@receiver(post_delete, sender=Property)
+def invalidate_listing_cache(sender, **kwargs):
+    cache.bump_generation()
+
+
+# Agent columns that listing responses show, which must move the cache
+# generation (and so the list ETag) when they change
+AGENT_USER_FIELDS = ('first_name', 'last_name')
+AGENT_PROFILE_FIELDS = ('phone_number',)
+
+
+def shown_values(model, instance, fields, update_fields):
+    if instance.pk is None or (update_fields is not None and not set(fields) & set(update_fields)):
+        return None
+    return model.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=User)
+def remember_agent_name(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Logins save only last_login, and skip the lookup
+    instance._shown_before = None if raw else shown_values(User, instance, AGENT_USER_FIELDS, update_fields)
+
+
+@receiver(pre_save, sender=Profile)
+def remember_agent_profile(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Every User save also saves the profile (users.signals), so compare
+    # instead of bumping on each save
+    instance._shown_before = None
+    if not raw and instance.role == 'agent':
+        instance._shown_before = shown_values(Profile, instance, AGENT_PROFILE_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def invalidate_for_agent_change(sender, instance, **kwargs):
+    before = getattr(instance, '_shown_before', None)
+    fields = AGENT_USER_FIELDS if sender is User else AGENT_PROFILE_FIELDS
+    if before is not None and before != tuple(getattr(instance, field) for field in fields):
+        cache.bump_generation()
+
+
+def touch_property(**filters):
+    # Gallery changes change the serialized property, so move its ETag on
+    Property.objects.filter(**filters).update(updated_at=Now())
+    cache.bump_generation()
+
+
+@receiver(post_save, sender=PropertyImage)
+def queue_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_variants(instance)
+        touch_property(pk=instance.property_id)
+
+
+@receiver(post_delete, sender=PropertyImage)
+def invalidate_after_image_delete(sender, instance, **kwargs):
+    touch_property(pk=instance.property_id)
+
+
+@receiver(variants_ready, sender=PropertyImage)
+def invalidate_after_variants(sender, pk, **kwargs):
+    touch_property(images__pk=pk)
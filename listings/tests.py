@@ -1,3 +1,842 @@
-from django.test import TestCase
+import base64
+import json
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from outbox.models import OutboxEmail
+
+from .digests import send_digests
+from .search import FTS_TABLE, rebuild_index, uses_fts
+from .models import Enquiry, Property, PropertyFacetCell, PropertyImage, PropertyMapCell
+from .views import (
+    AgentEnquiriesView,
+    MyPropertiesView,
+    MyPropertyDetailView,
+    PropertyFacetsView,
+    PropertyView,
+    UserEnquiriesView,
+)
+
+
+def make_user(email, role):
+    user = User.objects.create_user(username=email, email=email, password='Passw0rd!')
+    user.profile.role = role
+    user.profile.phone_number = '0800000000'
+    user.profile.save()
+    return user
+
+
+def make_property(agent, **kwargs):
+    fields = {
+        'title': 'House',
+        'property_type': 'SELL',
+        'description': 'A house',
+        'state': 'Lagos',
+        'country': 'Nigeria',
+        'location': 'Lekki',
+        'bathroom': 2,
+        'bedroom': 3,
+        'size': 120,
+        'is_published': True,
+        'price': 1000,
+    }
+    fields.update(kwargs)
+    return Property.objects.create(user=agent, agent=agent, **fields)
+
+
+class QueryBudgetTests(TestCase):
+    """Each list/detail view declares a query budget that holds for any row count."""
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+
+    def client_for(self, user):
+        # Reload the user so nothing is served from a previous request's cache
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        return client
+
+    def seed(self, count):
+        for i in range(count):
+            prop = make_property(self.agent, title=f'House {i}')
+            Enquiry.objects.create(user=self.buyer, property=prop, message='Hi')
+
+    def assertWithinBudget(self, view, method, user, url):
+        budget = view.query_budget[method]
+        client = self.client_for(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method)(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            len(ctx.captured_queries), budget,
+            '\n'.join(q['sql'] for q in ctx.captured_queries),
+        )
+
+    def test_budgets_hold_as_rows_grow(self):
+        for count in (1, 15):
+            self.seed(count)
+            detail_pk = Property.objects.filter(agent=self.agent).first().pk
+            with self.subTest(rows=Property.objects.count()):
+                self.assertWithinBudget(PropertyView, 'get', self.buyer, '/api/listings/get/properties/')
+                self.assertWithinBudget(MyPropertiesView, 'get', self.agent, '/api/listings/get/my/properties/')
+                self.assertWithinBudget(
+                    MyPropertyDetailView, 'get', self.agent, f'/api/listings/get/property/{detail_pk}/'
+                )
+                self.assertWithinBudget(AgentEnquiriesView, 'get', self.agent, '/api/listings/view/enquiries/')
+                self.assertWithinBudget(
+                    UserEnquiriesView, 'get', self.buyer, '/api/listings/view/response/renter/buyer/'
+                )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked against SQLite')
+class ListingIndexPlanTests(TestCase):
+    """Seed a realistic table and check the listing queries are served by the Meta.indexes."""
+
+    rows = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = make_user('agent@example.com', 'agent')
+        cls.other_agent = make_user('other@example.com', 'agent')
+        Property.objects.bulk_create([
+            Property(
+                user=agent, agent=agent, title=f'House {i}', property_type=('SELL', 'RENT')[i % 2],
+                description='A house', state='Lagos', country='Nigeria', location='Lekki',
+                state_normalized='lagos', country_normalized='nigeria',
+                bathroom=1, bedroom=1 + i % 5, size=100, price=1000 + i,
+                is_published=i % 4 != 0, is_active=i % 9 != 0,
+            )
+            for i, agent in enumerate([cls.agent, cls.other_agent] * (cls.rows // 2))
+        ], batch_size=500)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+
+    def query_plan(self, user, url):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The page query, not the count query
+        sql = next(
+            q['sql'] for q in ctx.captured_queries
+            if 'FROM "listings_property"' in q['sql'] and 'ORDER BY' in q['sql']
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, plan, name):
+        self.assertIn(f'USING INDEX {name}', plan)
+
+    def test_public_browse_uses_recent_index(self):
+        plan = self.query_plan(self.agent, '/api/listings/get/properties/')
+        self.assertUsesIndex(plan, 'property_public_recent_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_deep_page_uses_recent_index(self):
+        url = '/api/listings/get/properties/?page_size=50'
+        for _ in range(10):
+            client = APIClient()
+            client.force_authenticate(self.agent)
+            url = client.get(url).data['next']
+        plan = self.query_plan(self.agent, url)
+        self.assertUsesIndex(plan, 'property_public_recent_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_category_filter_uses_type_index(self):
+        plan = self.query_plan(self.agent, '/api/listings/get/properties/?category=RENT')
+        self.assertUsesIndex(plan, 'property_public_type_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_country_and_state_filters_use_location_index(self):
+        plan = self.query_plan(self.agent, '/api/listings/get/properties/?country=NIGERIA&state=lagos')
+        self.assertUsesIndex(plan, 'property_public_location_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_state_filter_uses_state_index(self):
+        plan = self.query_plan(self.agent, '/api/listings/get/properties/?state=Lagos')
+        self.assertUsesIndex(plan, 'property_public_state_idx')
+
+    def test_narrow_price_range_uses_price_index(self):
+        plan = self.query_plan(self.agent, '/api/listings/get/properties/?min_price=1100&max_price=1150')
+        self.assertUsesIndex(plan, 'property_public_price_idx')
+
+    def test_my_properties_uses_agent_index(self):
+        plan = self.query_plan(self.agent, '/api/listings/get/my/properties/')
+        self.assertUsesIndex(plan, 'property_agent_active_idx')
+
+
+class FacetCountTests(TestCase):
+
+    def setUp(self):
+        self.agent = make_user('agent@example.com', 'agent')
+
+    def cells(self):
+        return sorted(
+            PropertyFacetCell.objects.filter(count__gt=0)
+            .values_list('property_type', 'country', 'state', 'bedroom', 'price_bucket', 'count',
+                         'country_label', 'state_label')
+        )
+
+    def test_incremental_counts_match_rebuild(self):
+        first = make_property(self.agent)
+        second = make_property(self.agent, state='Abuja', price=250000)
+        hidden = make_property(self.agent, is_published=False)
+        gone = make_property(self.agent, property_type='RENT', bedroom=4)
+        make_property(self.agent, state='lagos')
+
+        second.state = 'Lagos'
+        second.save()
+        hidden.is_published = True
+        hidden.save()
+        first.is_active = False
+        first.save()
+        gone.delete()
+
+        incremental = self.cells()
+        call_command('rebuild_facets', stdout=StringIO())
+        self.assertEqual(incremental, self.cells())
+
+    def test_facets_endpoint_counts_public_listings(self):
+        make_property(self.agent, country='Ghana', state='Accra')
+        make_property(self.agent, state='Lagos')
+        make_property(self.agent, state='Lagos', is_published=False)
+
+        client = APIClient()
+        client.force_authenticate(self.agent)
+        facets = client.get('/api/listings/get/properties/facets/?country=nigeria').data['facets']
+        self.assertEqual(facets['state'], [{'value': 'lagos', 'label': 'Lagos', 'count': 1}])
+
+        facets = client.get('/api/listings/get/properties/facets/?location=lek').data['facets']
+        self.assertEqual(sum(row['count'] for row in facets['country']), 2)
+        self.assertEqual([row['label'] for row in facets['country']], ['Ghana', 'Nigeria'])
+
+    def test_live_counted_filters_stay_within_budget_and_are_cached(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.agent)
+        url = '/api/listings/get/properties/facets/?min_price=150000&search=house'
+        for count in (1, 12):
+            for i in range(count):
+                make_property(self.agent, price=100000 * (i + 1))
+            with self.assertNumQueries(PropertyFacetsView.query_budget['get']):
+                facets = client.get(url).data['facets']
+            self.assertEqual(
+                sum(row['count'] for row in facets['price']),
+                Property.objects.filter(price__gte=150000).count(),
+            )
+            with self.assertNumQueries(0):
+                self.assertEqual(client.get(url).data['facets'], facets)
+
+
+class ListingResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.staff = make_user('staff@example.com', 'renter/buyer')
+        self.staff.is_staff = True
+        self.staff.save()
+        self.listing = make_property(self.agent, title='Villa')
+
+    def get(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(url)
+
+    def test_repeat_reads_hit_and_writes_invalidate(self):
+        url = '/api/listings/get/properties/?country=Nigeria&category=SELL'
+        self.get(self.buyer, url)
+        # Neither the validator nor the cached response touches the database
+        with self.assertNumQueries(0):
+            response = self.get(self.buyer, '/api/listings/get/properties/?category=SELL&country=Nigeria')
+        self.assertEqual(response.data['results'][0]['title'], 'Villa')
+
+        self.listing.title = 'Renamed villa'
+        self.listing.save()
+        response = self.get(self.buyer, url)
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed villa')
+
+        counters = self.get(self.staff, '/api/listings/cache/stats/').data
+        self.assertEqual((counters['hit'], counters['miss']), (1, 2))
+
+    def test_staff_and_public_do_not_share_entries(self):
+        make_property(self.agent, title='Draft', is_published=False)
+        url = '/api/listings/get/properties/'
+        self.assertEqual(len(self.get(self.buyer, url).data['results']), 1)
+        self.assertEqual(len(self.get(self.staff, url).data['results']), 2)
+
+    def test_detail_is_cached_per_user(self):
+        url = f'/api/listings/get/property/{self.listing.pk}/'
+        self.assertEqual(self.get(self.agent, url).status_code, 200)
+        self.assertEqual(self.get(self.buyer, url).status_code, 404)
+
+
+@skipUnless(uses_fts(), 'FTS5 index is SQLite only')
+class SearchIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def search(self, text):
+        response = self.client.get('/api/listings/get/properties/', {'search': text, 'fields': 'title'})
+        return [row['title'] for row in response.data['results']]
+
+    def indexed_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {FTS_TABLE} ORDER BY rowid')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_words_match_as_prefixes(self):
+        make_property(self.agent, title='Apartment', location='Lekki Phase 1')
+        make_property(self.agent, title='Bungalow', location='Ikeja')
+        self.assertEqual(self.search('apar lek'), ['Apartment'])
+        self.assertEqual(self.search('APART'), ['Apartment'])
+        self.assertEqual(self.search('apartments'), [])
+
+    def test_title_hits_rank_above_description_hits(self):
+        make_property(self.agent, title='Garden flat', description='Quiet street')
+        make_property(self.agent, title='Terrace', description='Garden at the back, garden in front')
+        make_property(self.agent, title='Duplex', location='Garden City')
+        self.assertEqual(self.search('garden'), ['Garden flat', 'Duplex', 'Terrace'])
+
+    def test_signals_keep_the_index_current(self):
+        listing = make_property(self.agent, title='Cottage')
+        self.assertEqual(self.search('cottage'), ['Cottage'])
+
+        listing.title = 'Penthouse'
+        listing.save()
+        self.assertEqual(self.search('cottage'), [])
+        self.assertEqual(self.search('penthouse'), ['Penthouse'])
+
+        # Soft delete: the row stays indexed but is no longer visible
+        self.assertEqual(self.client.delete(f'/api/listings/delete/property/{listing.pk}/').status_code, 204)
+        self.assertEqual(self.search('penthouse'), [])
+        self.assertEqual(self.indexed_ids(), [listing.pk])
+
+        listing.delete()
+        self.assertEqual(self.indexed_ids(), [])
+
+    def test_rebuild_index_repopulates(self):
+        listings = [make_property(self.agent, title=f'Flat {i}') for i in range(3)]
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.search('flat'), [])
+
+        rebuild_index()
+        self.assertEqual(self.indexed_ids(), [listing.pk for listing in listings])
+        self.assertEqual(len(self.search('flat')), 3)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.titles = [make_property(self.agent, title=f'House {i}').title for i in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def titles_of(self, response):
+        return [row['title'] for row in response.data['results']]
+
+    def cursor(self, payload):
+        token = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        return self.client.get(f'/api/listings/get/properties/?cursor={token}')
+
+    def test_next_and_previous_links_walk_every_row_once(self):
+        response = self.client.get('/api/listings/get/properties/?page_size=2')
+        self.assertIsNone(response.data['previous'])
+        pages = [self.titles_of(response)]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(self.titles_of(response))
+        self.assertEqual(pages, [['House 4', 'House 3'], ['House 2', 'House 1'], ['House 0']])
+
+        second = self.client.get(self.client.get('/api/listings/get/properties/?page_size=2').data['next'])
+        previous = self.client.get(second.data['previous'])
+        self.assertEqual(self.titles_of(previous), ['House 4', 'House 3'])
+        self.assertIsNone(previous.data['previous'])
+        self.assertIsNotNone(previous.data['next'])
+
+    @override_settings(LISTINGS_PAGE_SIZE=2, LISTINGS_MAX_PAGE_SIZE=3)
+    def test_page_size_is_clamped(self):
+        for value, expected in (('', 2), ('0', 2), ('-4', 2), ('abc', 2), ('1', 1), ('1000', 3)):
+            response = self.client.get(f'/api/listings/get/properties/?page_size={value}')
+            self.assertEqual(len(response.data['results']), expected, value)
+
+    def test_invalid_cursors_are_not_found(self):
+        created_at = timezone.now().isoformat()
+        for payload in (
+            {'v': [1, 2]},
+            {'v': [created_at, 'x']},
+            {'v': [created_at, True]},
+            {'v': [created_at]},
+            {'v': [timezone.now().replace(tzinfo=None).isoformat(), 1]},
+            {'v': [created_at, 1], 'r': 'yes'},
+            {'v': 'abc'},
+            [1, 2],
+        ):
+            self.assertEqual(self.cursor(payload).status_code, 404, payload)
+        self.assertEqual(self.client.get('/api/listings/get/properties/?cursor=not-base64!').status_code, 404)
+        self.assertEqual(self.cursor({'v': [created_at, 10 ** 6]}).status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.listing = make_property(self.agent)
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def test_list_revalidates_until_a_listing_changes(self):
+        url = '/api/listings/get/properties/?category=SELL'
+        first = self.client.get(url)
+        self.assertTrue(first.has_header('ETag'))
+        self.assertTrue(first.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        other_page = self.client.get(url + '&page_size=5', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(other_page.status_code, 200)
+
+        self.listing.price = 2000
+        self.listing.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+
+    def test_list_validator_is_not_reused_after_the_cache_is_emptied(self):
+        url = '/api/listings/get/properties/'
+        # Each clear is like a restart with a per-process cache
+        cache.clear()
+        first = self.client.get(url)
+        self.listing.price = 2000
+        self.listing.save()
+        cache.clear()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['price'], '2000.00')
+
+    def test_list_revalidates_when_the_agent_profile_changes(self):
+        url = '/api/listings/get/properties/'
+        detail_url = f'/api/listings/get/property/{self.listing.pk}/'
+        first = self.client.get(url)
+        detail = self.client.get(detail_url)
+        self.agent.profile.phone_number = '0811111111'
+        self.agent.profile.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['agent_phoneNumber'], '0811111111')
+        detail = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(detail.data['property']['agent_phoneNumber'], '0811111111')
+
+        # Logging in saves only last_login and leaves the validator alone
+        self.agent.save(update_fields=['last_login'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 304)
+
+        self.agent.first_name = 'Ada'
+        self.agent.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['agent_name'].split()[0], 'Ada')
+        detail = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(detail.data['property']['agent_name'].split()[0], 'Ada')
+
+    def test_detail_honours_if_modified_since(self):
+        url = f'/api/listings/get/property/{self.listing.pk}/'
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False, MEDIA_ROOT=tempfile.mkdtemp())
+class ImageVariantTests(TestCase):
+
+    def test_upload_produces_resized_variants(self):
+        cache.clear()
+        agent = make_user('agent@example.com', 'agent')
+        upload = BytesIO()
+        Image.new('RGB', (2400, 1600), 'navy').save(upload, 'JPEG')
+        client = APIClient()
+        client.force_authenticate(agent)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/listings/create/property/', {
+                'title': 'Loft', 'property_type': 'RENT', 'description': 'Bright', 'state': 'Lagos',
+                'country': 'Nigeria', 'location': 'Yaba', 'bathroom': 1, 'bedroom': 1, 'size': 50,
+                'price': 100, 'main_image': SimpleUploadedFile('loft.jpg', upload.getvalue(), 'image/jpeg'),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+
+        cover = PropertyImage.objects.get()
+        variants = cover.image_variants['image']
+        self.assertEqual(variants['source'], cover.image.name)
+        self.assertEqual((cover.position, cover.width, cover.height), (0, 2400, 1600))
+        with Image.open(cover.image.storage.path(variants['thumb']['webp'])) as thumb:
+            self.assertEqual((thumb.format, max(thumb.size)), ('WEBP', 320))
+
+        detail = client.get(f'/api/listings/get/property/{cover.property_id}/').data['property']
+        self.assertTrue(detail['image_variants']['main_image']['card']['jpeg'].endswith('loft_card.jpeg'))
+        self.assertEqual(detail['images'][0]['image_variants']['thumb']['webp'],
+                         detail['image_variants']['main_image']['thumb']['webp'])
+
+    def test_gallery_has_no_fixed_limit_and_lists_load_only_covers(self):
+        cache.clear()
+        agent = make_user('agent@example.com', 'agent')
+        client = APIClient()
+        client.force_authenticate(agent)
+
+        def upload(name):
+            data = BytesIO()
+            Image.new('RGB', (64, 48), 'olive').save(data, 'PNG')
+            return SimpleUploadedFile(name, data.getvalue(), 'image/png')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/listings/create/property/', {
+                'title': 'Loft', 'property_type': 'RENT', 'description': 'Bright', 'state': 'Lagos',
+                'country': 'Nigeria', 'location': 'Yaba', 'bathroom': 1, 'bedroom': 1, 'size': 50,
+                'price': 100, 'is_published': True, 'main_image': upload('cover.png'),
+                'upload_images': [upload(f'room{i}.png') for i in range(6)],
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([image['position'] for image in response.data['data']['images']],
+                         [0, 5, 6, 7, 8, 9, 10])
+
+        with CaptureQueriesContext(connection) as ctx:
+            row = client.get('/api/listings/get/properties/').data['results'][0]
+        self.assertTrue(row['main_image'].endswith('cover.png'))
+        self.assertNotIn('images', row)
+        image_sql = [q['sql'] for q in ctx.captured_queries if 'listings_propertyimage' in q['sql']]
+        self.assertEqual(len(image_sql), 1)
+        self.assertIn('ROW_NUMBER', image_sql[0])
+
+
+class StreamingResponseTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        for i in range(7):
+            listing = make_property(self.agent, title=f'House {i}', price=1000 + i)
+            Enquiry.objects.create(user=self.buyer, property=listing, message=f'Is house {i} available?')
+        self.client = APIClient()
+
+    def assertStreamMatches(self, user, url):
+        self.client.force_authenticate(user)
+        buffered = self.client.get(url)
+        streamed = self.client.get(url + '?stream=1')
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b''.join(streamed.streaming_content), buffered.content)
+
+    def test_streamed_lists_match_buffered_output(self):
+        self.assertStreamMatches(self.agent, '/api/listings/get/my/properties/')
+        self.assertStreamMatches(self.agent, '/api/listings/view/enquiries/')
+        self.assertStreamMatches(self.buyer, '/api/listings/view/response/renter/buyer/')
+
+    def test_staff_export_streams_every_row(self):
+        staff = make_user('staff@example.com', 'agent')
+        staff.is_staff = True
+        staff.save()
+        self.client.force_authenticate(staff)
+        response = self.client.get('/api/listings/get/properties/?stream=1&page_size=2')
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual((data['next'], data['previous']), (None, None))
+        self.assertEqual(len(data['results']), 7)
+
+
+class SparseFieldsetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        for i in range(3):
+            make_property(self.agent, title=f'House {i}')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.agent.pk))
+
+    def fetch(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        page_sql = next(q['sql'] for q in ctx.captured_queries if 'ORDER BY' in q['sql'])
+        return response, page_sql
+
+    def test_fields_trims_output_and_columns(self):
+        response, sql = self.fetch('/api/listings/get/properties/?fields=id,title,price,main_image,location&page_size=2')
+        self.assertEqual(
+            list(response.data['results'][0]), ['id', 'title', 'location', 'price', 'main_image']
+        )
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('auth_user', sql)
+
+        # Cursors still work on a pruned page, without a query per row
+        with self.assertNumQueries(2):
+            next_page = self.client.get(response.data['next'])
+        self.assertEqual([row['title'] for row in next_page.data['results']], ['House 0'])
+
+    def test_omit_keeps_agent_join_only_when_needed(self):
+        response, sql = self.fetch('/api/listings/get/properties/?omit=description,agent_phoneNumber')
+        row = response.data['results'][0]
+        self.assertNotIn('description', row)
+        self.assertEqual(row['agent_name'], ' ')
+        self.assertIn('auth_user', sql)
+        self.assertNotIn('users_profile', sql)
+
+
+class MapSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.lekki = make_property(self.agent, title='Lekki', latitude=6.4474, longitude=3.4700)
+        self.ikeja = make_property(self.agent, title='Ikeja', latitude=6.6018, longitude=3.3515)
+        self.abuja = make_property(self.agent, title='Abuja', latitude=9.0765, longitude=7.3986)
+        make_property(self.agent, title='No coordinates')
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def titles(self, query):
+        response = self.client.get(f'/api/listings/get/properties/map/?{query}&fields=id,title')
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.data['results']]
+
+    def test_viewport_query(self):
+        self.assertCountEqual(self.titles('bbox=6.3,3.2,6.7,3.6'), ['Lekki', 'Ikeja'])
+        self.assertEqual(self.titles('bbox=6.3,3.4,6.5,3.6'), ['Lekki'])
+
+    def test_radius_query_orders_by_distance(self):
+        response = self.client.get('/api/listings/get/properties/map/?lat=6.45&lng=3.47&radius_km=25&fields=id,title')
+        self.assertEqual([row['title'] for row in response.data['results']], ['Lekki', 'Ikeja'])
+        self.assertLess(response.data['results'][0]['distance_km'], 1)
+
+    def test_invalid_queries_are_rejected(self):
+        for query in ('', 'bbox=1,2', 'bbox=7,3,6,4', 'lat=6&lng=3&radius_km=5000'):
+            response = self.client.get(f'/api/listings/get/properties/map/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Query plans are checked against SQLite')
+    def test_viewport_is_served_by_grid_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/listings/get/properties/map/?bbox=6.3,3.2,6.7,3.6')
+        sql = next(q['sql'] for q in ctx.captured_queries if 'geo_cell' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' | '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('USING INDEX property_public_geo_idx', plan)
+
+
+class MapClusterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+
+    def cells(self):
+        return sorted(
+            (zoom, row, col, count, round(lat, 6), round(lng, 6), low, high)
+            for zoom, row, col, count, lat, lng, low, high in PropertyMapCell.objects.filter(count__gt=0)
+            .values_list('zoom', 'row', 'col', 'count', 'latitude_sum', 'longitude_sum', 'min_price', 'max_price')
+        )
+
+    def test_incremental_clusters_match_rebuild(self):
+        first = make_property(self.agent, latitude=6.45, longitude=3.47, price=100000)
+        second = make_property(self.agent, latitude=6.60, longitude=3.35, price=900000)
+        hidden = make_property(self.agent, latitude=9.07, longitude=7.39, is_published=False)
+        gone = make_property(self.agent, latitude=6.46, longitude=3.48, price=50000)
+        make_property(self.agent)
+
+        second.latitude, second.longitude = 9.08, 7.40
+        second.save()
+        hidden.is_published = True
+        hidden.save()
+        first.is_active = False
+        first.save()
+        gone.delete()
+
+        incremental = self.cells()
+        call_command('rebuild_map_clusters', stdout=StringIO())
+        self.assertEqual(incremental, self.cells())
+
+    def test_clusters_endpoint(self):
+        make_property(self.agent, latitude=6.45, longitude=3.47, price=100000)
+        make_property(self.agent, latitude=6.60, longitude=3.35, price=300000)
+        make_property(self.agent, latitude=9.07, longitude=7.39, price=200000)
+
+        client = APIClient()
+        client.force_authenticate(self.agent)
+        data = client.get('/api/listings/get/properties/clusters/?bbox=4,2,14,15&zoom=5').data
+        self.assertEqual(data['zoom'], 4)
+        lagos, abuja = data['clusters']
+        self.assertEqual((lagos['count'], lagos['min_price'], lagos['max_price']), (2, 100000, 300000))
+        self.assertAlmostEqual(lagos['latitude'], 6.525)
+        self.assertEqual(abuja['count'], 1)
+
+        response = client.get('/api/listings/get/properties/clusters/?bbox=4,2,14,15')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkImportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.agent = make_user('agent@example.com', 'agent')
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def csv_file(self, rows):
+        header = 'title,property_type,description,state,country,location,bathroom,bedroom,size,price,is_published,latitude,longitude\n'
+        return SimpleUploadedFile('listings.csv', (header + ''.join(rows)).encode(), content_type='text/csv')
+
+    def test_csv_import_reports_bad_rows(self):
+        rows = [
+            'Flat,RENT,Two bed flat,Lagos,Nigeria,Yaba Lagos,1,2,80,250000,true,6.51,3.38\n',
+            'Broken,LEASE,Bad type,Lagos,Nigeria,Yaba,1,2,80,1,true,,\n',
+            '"Villa, sea view",SELL,Big villa,Lagos,Nigeria,Lekki,4,5,400,90000000,true,6.45,\n',
+            'Duplex,SELL,Duplex,Abuja,Nigeria,Maitama,3,4,300,50000000,false,,\n',
+        ]
+        response = self.client.post('/api/listings/import/properties/', {'file': self.csv_file(rows)},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        self.assertIn('property_type', response.data['errors'][0]['errors'])
+
+        flat = Property.objects.get(title='Flat')
+        self.assertEqual((flat.agent, flat.state_normalized, flat.geo_cell is not None), (self.agent, 'lagos', True))
+        titles = self.client.get('/api/listings/get/properties/?search=yaba&fields=title').data['results']
+        self.assertEqual(titles, [{'title': 'Flat'}])
+
+        facet_cells, cluster_cells = self.aggregates()
+        call_command('rebuild_facets', stdout=StringIO())
+        call_command('rebuild_map_clusters', stdout=StringIO())
+        self.assertEqual((facet_cells, cluster_cells), self.aggregates())
+
+    def aggregates(self):
+        return (
+            sorted(PropertyFacetCell.objects.filter(count__gt=0).values_list('state', 'price_bucket', 'count')),
+            sorted(PropertyMapCell.objects.filter(count__gt=0).values_list('zoom', 'row', 'col', 'count')),
+        )
+
+    def test_jsonl_command_imports_in_batches(self):
+        row = {'title': 'Flat', 'property_type': 'RENT', 'description': 'Flat', 'state': 'Lagos',
+               'country': 'Nigeria', 'location': 'Yaba', 'bathroom': 1, 'bedroom': 2, 'size': 80, 'price': 1000}
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as handle:
+            for i in range(7):
+                handle.write(json.dumps(dict(row, title=f'Flat {i}')) + '\n')
+            handle.write('not json\n')
+            handle.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_properties', handle.name, agent='agent@example.com', batch_size=3,
+                         stdout=out, stderr=err)
+        self.assertEqual(Property.objects.filter(agent=self.agent).count(), 7)
+        self.assertIn('Imported 7 listings, 1 rows failed.', out.getvalue())
+        self.assertIn('line 8', err.getvalue())
+
+    def test_only_agents_can_import(self):
+        buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.client.force_authenticate(buyer)
+        response = self.client.post('/api/listings/import/properties/', {'file': self.csv_file([])},
+                                    format='multipart')
+        self.assertEqual(response.status_code, 403)
+
+
+class EnquiryDigestTests(TestCase):
+
+    def setUp(self):
+        self.agent = make_user('agent@example.com', 'agent')
+        self.busy = make_user('busy@example.com', 'agent')
+        self.busy.profile.enquiry_emails = 'digest'
+        self.busy.profile.save()
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def enquire(self, prop, message='Is it available?'):
+        response = self.client.post(f'/api/listings/enquire/{prop.pk}/', {'message': message})
+        self.assertEqual(response.status_code, 201)
+
+    def test_digest_agents_get_one_summary_per_window(self):
+        quiet = make_property(self.agent, title='Cottage')
+        popular = [make_property(self.busy, title=f'Penthouse {i}') for i in range(3)]
+        self.enquire(quiet)
+        for prop in popular:
+            self.enquire(prop)
+            self.enquire(prop, 'Can I view it?')
+        self.assertEqual(list(OutboxEmail.objects.values_list('recipients', flat=True)), [['agent@example.com']])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(send_digests(), 1)
+        # Every digest is built from one grouped read of a page
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('SELECT')]), 1)
+        digest = OutboxEmail.objects.get(recipients=['busy@example.com'])
+        self.assertEqual(digest.subject, '6 new enquiries on your listings')
+        self.assertIn('Penthouse 2: ', digest.body)
+        self.assertFalse(Enquiry.objects.filter(notified_at__isnull=True).exists())
+
+        # Within the window new enquiries wait for the next digest
+        self.enquire(popular[0])
+        self.assertEqual(send_digests(), 0)
+        later = timezone.now() + timedelta(minutes=61)
+        self.assertEqual(send_digests(now=later), 1)
+        self.assertEqual(OutboxEmail.objects.filter(recipients=['busy@example.com']).count(), 2)
+
+    def test_pages_split_between_agents(self):
+        agents = [self.busy]
+        for name in ('second', 'third'):
+            agent = make_user(f'{name}@example.com', 'agent')
+            agent.profile.enquiry_emails = 'digest'
+            agent.profile.save()
+            agents.append(agent)
+        counts = (5, 2, 1)
+        for agent, count in zip(agents, counts):
+            prop = make_property(agent)
+            for _ in range(count):
+                self.enquire(prop)
+
+        # Pages of 3 cut the first agent's enquiries short and end part-way through the second's
+        self.assertEqual(send_digests(page_size=3), 3)
+        subjects = {
+            email.recipients[0]: email.subject
+            for email in OutboxEmail.objects.exclude(recipients=['agent@example.com'])
+        }
+        self.assertEqual(subjects, {
+            'busy@example.com': '5 new enquiries on your listings',
+            'second@example.com': '2 new enquiries on your listings',
+            'third@example.com': '1 new enquiry on your listings',
+        })
+        self.assertFalse(Enquiry.objects.filter(notified_at__isnull=True).exists())
@@ -3,7 +3,12 @@ from .views import *
 
 urlpatterns = [
     path('create/property/', MyPropertyDetailView.as_view()),
+    path('import/properties/', PropertyImportView.as_view()),
     path('get/properties/', PropertyView.as_view()),
+    path('get/properties/facets/', PropertyFacetsView.as_view()),
+    path('get/properties/map/', PropertyMapView.as_view()),
+    path('get/properties/clusters/', PropertyClusterView.as_view()),
+    path('cache/stats/', ListingCacheStatsView.as_view()),
     path('get/my/properties/', MyPropertiesView().as_view()),
     path('get/property/<int:pk>/', MyPropertyDetailView.as_view()),
     path('update/property/<int:pk>/', MyPropertyDetailView.as_view()),
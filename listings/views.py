@@ -4,73 +4,255 @@ from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Property
-from django.core.mail import send_mail
+from .models import Property, normalize_location
+from outbox.mail import queue_mail
 from rest_framework.permissions import IsAuthenticated
 from .serializers import *
+from .pagination import KeysetPagination
+from .search import search_properties
+from .facets import facet_counts_from_cells, facet_counts_from_queryset
+from .cache import (
+    cache_listing_response, canonical_params, changed_at, current_generation, visibility_class, stats as cache_stats,
+)
 from rest_framework.permissions import IsAdminUser
-from django.db.models import Q
+from main_project.conditional import conditional_get, make_etag
+from main_project.streaming import stream_json, wants_stream
+from .geo import parse_bbox, within_bbox, within_radius
+from .clusters import cluster_data, cluster_level, clusters_in_bbox
+from .imports import ImportFormatError, detect_format, import_properties
+from django.conf import settings
+
+def filter_properties(properties, params):
+    # --- Filtering based on query parameters ---
+    category = params.get('category')
+    country = params.get('country')
+    state = params.get('state')
+    location = params.get('location')
+    min_price = params.get('min_price')
+    max_price = params.get('max_price')
+    search = params.get('search')
+
+    # Clean and apply filters
+    if category:
+        category = category.strip()
+        properties = properties.filter(property_type=category)
+    if country:
+        country = country.strip()
+        properties = properties.filter(country_normalized=normalize_location(country))
+    if state:
+        state = state.strip()
+        properties = properties.filter(state_normalized=normalize_location(state))
+    if location:
+        location = location.strip()
+        properties = properties.filter(location__icontains=location)
+
+    try:
+        if min_price:
+            properties = properties.filter(price__gte=float(min_price))
+    except ValueError:
+        pass  # Ignore invalid price filter
+
+    try:
+        if max_price:
+            properties = properties.filter(price__lte=float(max_price))
+    except ValueError:
+        pass
+
+    if search:
+        search = search.strip()
+        properties = search_properties(properties, search)
+
+    return properties
+
+
+def visible_properties(user):
+    # Admins see everything; normal users see only active + published properties
+    if user.is_authenticated and user.is_staff:
+        return Property.objects.all()
+    return Property.objects.filter(is_active=True, is_published=True)
+
+
+def property_list_version(request):
+    # The listing cache generation moves on every write that can change a
+    # listing response (properties, their images, agents' names and
+    # profiles), so the validator needs no query at all
+    etag = make_etag(
+        'properties', request.get_host(), visibility_class(request.user),
+        canonical_params(request.query_params), current_generation(),
+    )
+    return etag, changed_at()
+
+
+def property_detail_version(request, pk):
+    # The body also shows the agent's name and phone, which updated_at
+    # doesn't cover: the ETag hashes them, and Last-Modified is no earlier
+    # than the last listing cache change (agent edits count as one)
+    version = (
+        Property.objects.filter(pk=pk, agent=request.user, is_active=True)
+        .values_list('updated_at', 'agent__first_name', 'agent__last_name', 'agent__profile__phone_number')
+        .first()
+    )
+    if version is None:
+        return None, None
+    updated_at = version[0]
+    return make_etag('property', request.get_host(), request.user.pk, pk, *version), max(updated_at, changed_at())
+
 
 class PropertyView(APIView):
     permission_classes = [IsAuthenticated]
+    # Queries per request, independent of the number of rows returned
+    query_budget = {'get': 2}
 
+    @conditional_get(property_list_version)
+    @cache_listing_response('properties')
     def get(self, request):
-        user = request.user if request.user.is_authenticated else None
+        fields = PropertySerializer.requested_fields(request)
+        properties = filter_properties(visible_properties(request.user), request.query_params)
+        properties = PropertySerializer.optimize_queryset(properties, fields)
 
-        # Admins see everything; normal users see only active + published properties
-        if user and user.is_staff:
-            properties = Property.objects.all()
+        if request.query_params.get('search'):
+            paginator = KeysetPagination(ordering=('search_rank', 'created_at', 'pk'))
         else:
-            properties = Property.objects.filter(is_active=True, is_published=True)
-
-        # --- Filtering based on query parameters ---
-        category = request.query_params.get('category')
-        country = request.query_params.get('country')
-        state = request.query_params.get('state')
-        location = request.query_params.get('location')
-        min_price = request.query_params.get('min_price')
-        max_price = request.query_params.get('max_price')
-        search = request.query_params.get('search')
-
-        # Clean and apply filters
-        if category:
-            category = category.strip()
-            properties = properties.filter(property_type=category)
-        if country:
-            country = country.strip()
-            properties = properties.filter(country__iexact=country)
-        if state:
-            state = state.strip()
-            properties = properties.filter(state__iexact=state)
-        if location:
-            location = location.strip()
-            properties = properties.filter(location__icontains=location)
+            paginator = KeysetPagination()
+
+        # Staff exports: every matching row in one streamed page
+        if request.user.is_staff and wants_stream(request):
+            properties = properties.order_by(*(f'-{field}' for field in paginator.ordering))
+            return stream_json(
+                properties, PropertySerializer, context={'request': request},
+                key='results', extra={'next': None, 'previous': None},
+                serializer_kwargs={'fields': fields},
+            )
+
+        page = paginator.paginate_queryset(properties, request, view=self)
+        serializer = PropertySerializer(page, many=True, context={'request': request}, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class PropertyMapView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_radius_km = 1000
+
+    def get(self, request):
+        params = request.query_params
+        fields = PropertySerializer.requested_fields(request)
+        properties = filter_properties(visible_properties(request.user), params)
+        by_distance = False
 
         try:
-            if min_price:
-                properties = properties.filter(price__gte=float(min_price))
+            if params.get('bbox'):
+                properties = within_bbox(properties, *parse_bbox(params['bbox'])).order_by('geo_cell', 'pk')
+            elif params.get('lat') and params.get('lng') and params.get('radius_km'):
+                latitude, longitude = float(params['lat']), float(params['lng'])
+                radius_km = float(params['radius_km'])
+                if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius_km <= self.max_radius_km):
+                    raise ValueError
+                properties = within_radius(properties, latitude, longitude, radius_km)
+                by_distance = True
+            else:
+                return Response(
+                    {'detail': 'Provide bbox=south,west,north,east or lat, lng and radius_km.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
         except ValueError:
-            pass  # Ignore invalid price filter
+            return Response({'detail': 'Invalid map query.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        limit = getattr(settings, 'LISTINGS_MAP_MAX_RESULTS', 500)
+        rows = list(PropertySerializer.optimize_queryset(properties, fields)[:limit + 1])
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+
+        results = PropertySerializer(rows, many=True, context={'request': request}, fields=fields).data
+        if by_distance:
+            for obj, data in zip(rows, results):
+                data['distance_km'] = round(obj.distance_km, 3)
+        return Response({'count': len(results), 'truncated': truncated, 'results': results},
+                        status=status.HTTP_200_OK)
+
+
+class PropertyClusterView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_zoom = 22
 
+    @cache_listing_response('clusters')
+    def get(self, request):
+        # Clusters are built from public listings only and ignore listing
+        # filters; the client switches to PropertyMapView once zoomed in
         try:
-            if max_price:
-                properties = properties.filter(price__lte=float(max_price))
+            south, west, north, east = parse_bbox(request.query_params.get('bbox', ''))
+            zoom = int(request.query_params.get('zoom', ''))
+            if not 0 <= zoom <= self.max_zoom:
+                raise ValueError
         except ValueError:
-            pass
-
-        if search:
-            search = search.strip()
-            properties = properties.filter(
-                Q(title__icontains=search) |
-                Q(description__icontains=search)
+            return Response(
+                {'detail': 'Provide bbox=south,west,north,east and an integer zoom.'},
+                status=status.HTTP_400_BAD_REQUEST,
             )
 
-        serializer = PropertySerializer(properties, many=True, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        limit = getattr(settings, 'LISTINGS_MAP_MAX_RESULTS', 500)
+        cells = list(clusters_in_bbox(zoom, south, west, north, east)[:limit + 1])
+        truncated = len(cells) > limit
+        clusters = [cluster_data(cell) for cell in cells[:limit]]
+        return Response(
+            {'zoom': cluster_level(zoom), 'truncated': truncated, 'clusters': clusters},
+            status=status.HTTP_200_OK,
+        )
+
+
+class PropertyFacetsView(APIView):
+    """Facet counts for the listing filters.
+
+    Category/country/state filters are answered from PropertyFacetCell. A
+    location, price range or search filter can't be answered from the
+    cells: prices are only bucketed there, and location and search match
+    free text. Those requests count live, with one GROUP BY per facet over
+    the filtered listings. Like every other listing response, the result is
+    cached until a listing changes, so each distinct filter is only counted
+    once per cache generation.
+
+    Country and state values are the casefolded keys the filters take; each
+    also carries a ``label``, an original spelling to display.
+    """
+    permission_classes = [IsAuthenticated]
+    filter_params = {'category', 'country', 'state', 'location', 'min_price', 'max_price', 'search'}
+    # Filters the facet table can answer; anything else is counted live
+    cell_filters = {'category', 'country', 'state'}
+    # Queries per uncached request on either path: one per facet
+    query_budget = {'get': 5}
+
+    @cache_listing_response('facets')
+    def get(self, request):
+        params = {
+            key: value for key, value in request.query_params.items()
+            if key in self.filter_params and value.strip()
+        }
+
+        if set(params) <= self.cell_filters:
+            filters = {}
+            if 'category' in params:
+                filters['property_type'] = params['category'].strip()
+            if 'country' in params:
+                filters['country'] = normalize_location(params['country'].strip())
+            if 'state' in params:
+                filters['state'] = normalize_location(params['state'].strip())
+            facets = facet_counts_from_cells(filters)
+        else:
+            properties = filter_properties(Property.objects.filter(is_active=True, is_published=True), params)
+            facets = facet_counts_from_queryset(properties)
+
+        return Response({'facets': facets}, status=status.HTTP_200_OK)
+
+
+class ListingCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
 
 
 class MyPropertiesView(APIView):
     permission_classes = [IsAuthenticated]  
+    query_budget = {'get': 3}
 
     def get(self, request):
         user = request.user
@@ -78,19 +260,57 @@ class MyPropertiesView(APIView):
         if not hasattr(user, 'profile') or user.profile.role != 'agent':
             return Response({'detail': 'Only agents can view their properties.'}, status=status.HTTP_403_FORBIDDEN)
     
-        properties = Property.objects.filter(agent=user, is_active=True).order_by('-created_at')
-        serializer = PropertySerializer(properties, many=True, context={'request': request})
+        fields = PropertySerializer.requested_fields(request)
+        properties = PropertySerializer.optimize_queryset(
+            Property.objects.filter(agent=user, is_active=True).order_by('-created_at'), fields
+        )
+        if wants_stream(request):
+            return stream_json(
+                properties, PropertySerializer, context={'request': request}, key='properties',
+                serializer_kwargs={'fields': fields},
+            )
+        serializer = PropertySerializer(properties, many=True, context={'request': request}, fields=fields)
         return Response({'properties': serializer.data}, status=status.HTTP_200_OK)
 
+class PropertyImportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # Only agents can post properties
+        if not hasattr(request.user, 'profile') or request.user.profile.role != 'agent':
+            return Response({'detail': 'Only agents can post properties.'}, status=status.HTTP_403_FORBIDDEN)
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'detail': 'Upload a CSV or JSONL file as "file".'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            fmt = detect_format(upload.name, request.data.get('format') or request.query_params.get('format'))
+            report = import_properties(upload, fmt, request.user)
+        except ImportFormatError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if report['failed'] and not report['created']:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED)
+
+
 class MyPropertyDetailView(APIView):
     permission_classes = [IsAuthenticated]  
+    query_budget = {'get': 3}
+
+    @conditional_get(property_detail_version)
+    @cache_listing_response('property-detail', per_user=True)
     def get(self, request, pk):
+        fields = PropertyDetailSerializer.requested_fields(request)
         try:
-            property = Property.objects.get(pk=pk, agent=request.user, is_active=True)
+            property = PropertyDetailSerializer.optimize_queryset(Property.objects.all(), fields).get(
+                pk=pk, agent=request.user, is_active=True
+            )
         except Property.DoesNotExist:
             return Response({'detail': 'Property not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = PropertySerializer(property, context={'request': request})
+        serializer = PropertyDetailSerializer(property, context={'request': request}, fields=fields)
         return Response({'property': serializer.data}, status=status.HTTP_200_OK)
     
     def post(self, request):
@@ -99,7 +319,7 @@ class MyPropertyDetailView(APIView):
             return Response({'detail': 'Only agents can post properties.'}, status=status.HTTP_403_FORBIDDEN)
 
         # Proceed with serializer
-        serializer = PropertySerializer(data=request.data, context={'request': request})
+        serializer = PropertyDetailSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response({
@@ -113,12 +333,12 @@ class MyPropertyDetailView(APIView):
         }, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, pk):
-        property = get_object_or_404(Property, pk=pk)
+        property = get_object_or_404(Property.objects.select_related('agent__profile'), pk=pk)
 
-        if property.agent != request.user:
+        if property.agent_id != request.user.id:
             return Response({'detail': 'You can only update your own properties.'}, status=status.HTTP_403_FORBIDDEN)
 
-        serializer = PropertySerializer(property, data=request.data, partial=True, context={'request': request})
+        serializer = PropertyDetailSerializer(property, data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response({'message': 'Property updated.', 'property': serializer.data}, status=status.HTTP_200_OK)
@@ -127,7 +347,7 @@ class MyPropertyDetailView(APIView):
     def delete(self, request, pk):
         property = get_object_or_404(Property, pk=pk)
 
-        if property.agent != request.user:
+        if property.agent_id != request.user.id:
             return Response({'detail': 'You can only delete your own properties.'}, status=status.HTTP_403_FORBIDDEN)
 
         # Soft delete
@@ -169,14 +389,22 @@ class MakeEnquiryView(APIView):
         if not profile or profile.role.lower() not in ['renter', 'buyer', 'renter/buyer']:
             return Response({'detail': 'Only renters or buyers can make enquiries.'}, status=status.HTTP_403_FORBIDDEN)
 
-        property = get_object_or_404(Property, id=property_id, is_active=True, is_published=True)
+        property = get_object_or_404(
+            Property.objects.select_related('agent__profile'), id=property_id, is_active=True, is_published=True
+        )
 
         serializer = EnquirySerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
-            enquiry = serializer.save(user=user, property=property)
+            agent_profile = getattr(property.agent, 'profile', None)
+            if agent_profile is not None and agent_profile.enquiry_emails == 'digest':
+                # Left for the agent's next send_enquiry_digests summary
+                serializer.save(user=user, property=property)
+                return Response({'message': 'Enquiry submitted successfully.'}, status=status.HTTP_201_CREATED)
+
+            enquiry = serializer.save(user=user, property=property, notified_at=timezone.now())
 
             # Send email to the agent
-            send_mail(
+            queue_mail(
                 subject=f"New Enquiry on {property.title}",
                 message=(
                     f"Hi {property.agent.first_name},\n\n"
@@ -188,7 +416,6 @@ class MakeEnquiryView(APIView):
                 ),
                 from_email=None,
                 recipient_list=[property.agent.email],
-                fail_silently=True,
             )
 
             return Response({'message': 'Enquiry submitted successfully.'}, status=status.HTTP_201_CREATED)
@@ -204,10 +431,10 @@ class EnquiryReplyView(APIView):
         if not profile or profile.role != 'agent':
             return Response({'detail': 'Only agents can reply to enquiries.'}, status=status.HTTP_403_FORBIDDEN)
 
-        enquiry = get_object_or_404(Enquiry, id=enquiry_id)
+        enquiry = get_object_or_404(Enquiry.objects.select_related('property', 'user'), id=enquiry_id)
 
         # Ensure the agent owns the property
-        if enquiry.property.agent != user:
+        if enquiry.property.agent_id != user.id:
             return Response({'detail': 'You are not authorized to reply to this enquiry.'}, status=status.HTTP_403_FORBIDDEN)
 
         reply_text = request.data.get('reply')
@@ -220,19 +447,19 @@ class EnquiryReplyView(APIView):
         enquiry.save()
 
         # Notify the user via email
-        send_mail(
+        queue_mail(
             subject=f"Reply to your enquiry on {enquiry.property.title}",
             message=f"Hello {enquiry.user.first_name},\n\nYou received a reply to your enquiry on '{enquiry.property.title}':\n\n"
                     f"{reply_text}\n\nBest regards,\nReal Estate Team",
             from_email=None,
             recipient_list=[enquiry.user.email],
-            fail_silently=True
         )
 
         return Response({'message': 'Reply sent and saved successfully.'}, status=status.HTTP_200_OK)
 
 class AgentEnquiriesView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {'get': 2}
 
     def get(self, request):
         # Ensure only agents can access this
@@ -242,11 +469,14 @@ class AgentEnquiriesView(APIView):
 
         # Fetch all enquiries for properties owned by this agent (i.e. where agent == request.user)
         enquiries = Enquiry.objects.filter(property__agent=request.user).order_by('-created_at')
+        if wants_stream(request):
+            return stream_json(enquiries, EnquirySerializer, context={'request': request}, key='enquiries')
         serializer = EnquirySerializer(enquiries, many=True, context={'request': request})
         return Response({'enquiries': serializer.data}, status=status.HTTP_200_OK)
 
 class UserEnquiriesView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = {'get': 2}
 
     def get(self, request):
         user = request.user
@@ -256,5 +486,7 @@ class UserEnquiriesView(APIView):
             return Response({'detail': 'Only renters or buyers can view their enquiries.'}, status=status.HTTP_403_FORBIDDEN)
 
         enquiries = Enquiry.objects.filter(user=user).order_by('-created_at')
+        if wants_stream(request):
+            return stream_json(enquiries, EnquirySerializer, context={'request': request}, key='enquiries')
         serializer = EnquirySerializer(enquiries, many=True, context={'request': request})
         return Response({'enquiries': serializer.data}, status=status.HTTP_200_OK)
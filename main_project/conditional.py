@@ -0,0 +1,37 @@
+import hashlib
+from functools import wraps
+
+from django.views.decorators.http import condition
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def conditional_get(version_func):
+    """ETag / Last-Modified support for an APIView method.
+
+    ``version_func(request, *args, **kwargs)`` returns ``(etag, last_modified)``,
+    either of which may be None. It should read data versions (timestamps,
+    counts) rather than the serialized body, so a 304 costs one small query.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            versions = []
+
+            def version(req, *a, **kw):
+                if not versions:
+                    versions.append(version_func(req, *a, **kw))
+                return versions[0]
+
+            @condition(
+                etag_func=lambda req, *a, **kw: version(req, *a, **kw)[0],
+                last_modified_func=lambda req, *a, **kw: version(req, *a, **kw)[1],
+            )
+            def handler(req, *a, **kw):
+                return method(view, req, *a, **kw)
+
+            return handler(request, *args, **kwargs)
+        return wrapper
+    return decorator
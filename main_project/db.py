@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+
+# SQLite starts transactions DEFERRED: the write lock is only taken at the
+# first write. A transaction that reads rows it is about to update (what
+# select_for_update stands for elsewhere) can then find another writer
+# holding the lock and fail at once with "database is locked", because
+# waiting would deadlock. Transactions like that are started IMMEDIATE
+# instead, taking the write lock up front and waiting up to the connection
+# timeout for it. Every other transaction keeps the default, so reads and
+# unrelated writes don't queue behind each other.
+
+
+@contextmanager
+def write_transaction(using=None):
+    """``transaction.atomic()`` that takes SQLite's write lock when it begins.
+
+    Only the outermost block changes how the transaction starts; nested in
+    another atomic block, or on other databases, it is a plain atomic block.
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # Connecting resets transaction_mode from the settings, so connect first
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous
+            yield
+    finally:
+        connection.transaction_mode = previous
@@ -0,0 +1,167 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, models, transaction
+from django.db.models.functions import Now
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+# Resized WebP/JPEG variants of uploaded images. They are generated after the
+# upload's transaction commits, on a small thread pool, so the request that
+# uploaded the image does not wait for Pillow. Each model keeps a JSON map of
+#     {field: {"source": <original name>, "width": w, "height": h,
+#              "<size>": {"webp": <name>, "jpeg": <name>}}}
+# in its image_variants column; a variant is only served while "source" still
+# matches the field's current file.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = {'thumb': 320, 'card': 800, 'full': 1600}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# Sent with the model class as sender once an instance's variants are saved
+variants_ready = Signal()
+
+_executor = None
+
+
+def variant_sizes():
+    return getattr(settings, 'IMAGE_VARIANT_SIZES', DEFAULT_SIZES)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_VARIANT_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def image_fields(instance):
+    return [f for f in instance._meta.fields if isinstance(f, models.ImageField)]
+
+
+def pending_fields(instance):
+    variants = instance.image_variants or {}
+    pending = []
+    for field in image_fields(instance):
+        name = getattr(instance, field.name).name
+        if name and variants.get(field.name, {}).get('source') != name:
+            pending.append(field.name)
+    return pending
+
+
+def render_variants(field_file):
+    storage = field_file.storage
+    directory, filename = os.path.split(field_file.name)
+    stem = os.path.splitext(filename)[0]
+
+    with storage.open(field_file.name, 'rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+
+    variants = {'source': field_file.name, 'width': original.width, 'height': original.height}
+    for size_name, size in variant_sizes().items():
+        resized = original.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        variants[size_name] = {}
+        for ext, (fmt, options) in FORMATS.items():
+            image = resized.convert('RGB') if fmt == 'JPEG' else resized
+            buffer = BytesIO()
+            image.save(buffer, fmt, **options)
+            path = os.path.join(directory, 'variants', f'{stem}_{size_name}.{ext}')
+            variants[size_name][ext] = storage.save(path, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def delete_variants(storage, entry):
+    for size_name in variant_sizes():
+        for name in (entry.get(size_name) or {}).values():
+            storage.delete(name)
+
+
+def generate_variants(model, pk, fields):
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return None
+    variants = dict(instance.image_variants or {})
+    for field_name in fields:
+        field_file = getattr(instance, field_name)
+        previous = variants.pop(field_name, None)
+        if previous:
+            delete_variants(field_file.storage, previous)
+        if not field_file.name:
+            continue
+        try:
+            variants[field_name] = render_variants(field_file)
+        except (OSError, ValueError):
+            # Missing file or not an image Pillow can read: serve the original,
+            # and remember the source so the next save does not retry it
+            logger.warning('Could not build variants for %s.%s of %s', model.__name__, field_name, pk)
+            variants[field_name] = {'source': field_file.name, 'failed': True}
+
+    updates = {'image_variants': variants}
+    columns = {f.name for f in model._meta.fields}
+    if 'updated_at' in columns:
+        updates['updated_at'] = Now()
+    single = image_fields(instance)
+    if {'width', 'height'} <= columns and len(single) == 1:
+        # Single-image models also record the original's dimensions
+        entry = variants.get(single[0].name) or {}
+        updates['width'], updates['height'] = entry.get('width'), entry.get('height')
+    model._default_manager.filter(pk=pk).update(**updates)
+    variants_ready.send(sender=model, pk=pk)
+    return variants
+
+
+def _run_in_background(label, pk, fields):
+    try:
+        generate_variants(apps.get_model(label), pk, fields)
+    except Exception:
+        logger.exception('Image variant generation failed for %s %s', label, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(instance):
+    """Queue variant generation for any image field whose variants are out of date."""
+    fields = pending_fields(instance)
+    if not fields:
+        return
+    label, pk = instance._meta.label, instance.pk
+
+    def submit():
+        if getattr(settings, 'IMAGE_VARIANTS_ASYNC', True):
+            get_executor().submit(_run_in_background, label, pk, fields)
+        else:
+            generate_variants(apps.get_model(label), pk, fields)
+
+    transaction.on_commit(submit)
+
+
+def variant_urls(instance, request=None):
+    """Variant URLs per image field, for fields whose variants match the current file."""
+    urls = {}
+    variants = instance.image_variants or {}
+    for field in image_fields(instance):
+        field_file = getattr(instance, field.name)
+        entry = variants.get(field.name)
+        if not entry or entry.get('failed') or entry.get('source') != field_file.name:
+            continue
+        urls[field.name] = {}
+        for size_name in variant_sizes():
+            urls[field.name][size_name] = {}
+            for ext, name in (entry.get(size_name) or {}).items():
+                url = field_file.storage.url(name)
+                urls[field.name][size_name][ext] = request.build_absolute_uri(url) if request else url
+    return urls
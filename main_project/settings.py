@@ -1,4 +1,6 @@
 import os
+from urllib.parse import unquote, urlsplit
+
 from dotenv import load_dotenv
 
 # Load environment variables from .env
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
     "listings",
     "checkout",
     "payment",
+    "outbox",
     "corsheaders",
     "rest_framework",
     "rest_framework_simplejwt",
@@ -80,9 +83,35 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Seconds a writer waits for the lock before "database is locked".
+            # Transactions that read rows and then update them take the lock
+            # up front (main_project.db.write_transaction); the rest start
+            # deferred, so they don't queue behind each other.
+            "timeout": 20,
+        },
+        # A file rather than shared in-memory database, so tests that run
+        # requests on several threads see real SQLite locking
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Deployments run the web service, the outbox worker and the cron jobs as
+# separate processes (see render.yaml); they only see each other's rows
+# through a shared database, so there DATABASE_URL is required.
+DATABASE_URL = os.environ.get("DATABASE_URL")
+if DATABASE_URL:
+    url = urlsplit(DATABASE_URL)
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": url.path.lstrip("/"),
+        "USER": unquote(url.username or ""),
+        "PASSWORD": unquote(url.password or ""),
+        "HOST": url.hostname or "",
+        "PORT": str(url.port or ""),
+        "CONN_MAX_AGE": 60,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +166,32 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
 }
+
+# Keyset pagination for the public property search
+LISTINGS_PAGE_SIZE = int(os.environ.get('LISTINGS_PAGE_SIZE', 20))
+LISTINGS_MAX_PAGE_SIZE = 100
+
+# The listing cache generation counter lives here too, and it is bumped by
+# whichever process changes a listing: gunicorn workers, but also the cron
+# jobs settling payments and imports run from the command line. So with a
+# shared database the cache defaults to a table in it (created by
+# "manage.py createcachetable" in build.sh), which every process sees. The
+# per-process memory cache is only the default for a local SQLite setup.
+if DATABASE_URL:
+    CACHE_DEFAULTS = ("django.core.cache.backends.db.DatabaseCache", "django_cache")
+else:
+    CACHE_DEFAULTS = ("django.core.cache.backends.locmem.LocMemCache", "real-estate")
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", CACHE_DEFAULTS[0]),
+        "LOCATION": os.environ.get("CACHE_LOCATION", CACHE_DEFAULTS[1]),
+    }
+}
+
+# Cached listing responses, invalidated on every Property write
+LISTINGS_RESPONSE_CACHE = os.environ.get('LISTINGS_RESPONSE_CACHE', 'True') == 'True'
+LISTINGS_RESPONSE_CACHE_TIMEOUT = 300
+
 from datetime import timedelta
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
@@ -155,6 +210,8 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 PAYSTACK_SECRET_KEY = os.environ.get('PAYSTACK_SECRET_KEY')
 PAYSTACK_PUBLIC_KEY = os.environ.get('PAYSTACK_PUBLIC_KEY')
 PAYSTACK_CALLBACK_URL = os.getenv('PAYSTACK_CALLBACK_URL')
+# Point at a local fake_paystack server for load tests
+PAYSTACK_BASE_URL = os.getenv('PAYSTACK_BASE_URL', 'https://api.paystack.co')
 
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -0,0 +1,60 @@
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+
+
+def wants_stream(request):
+    return request.query_params.get('stream', '').lower() in TRUE_VALUES
+
+
+def _dumps(value):
+    # Same encoding options as DRF's JSONRenderer, so the bytes match a normal response
+    return json.dumps(
+        value,
+        cls=JSONEncoder,
+        ensure_ascii=not api_settings.UNICODE_JSON,
+        allow_nan=not api_settings.STRICT_JSON,
+        separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+    )
+
+
+def _chunks(queryset, size):
+    rows = queryset.iterator(chunk_size=size)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_json(queryset, serializer_class, context=None, key=None, extra=None, chunk_size=500, status=200,
+                serializer_kwargs=None):
+    """Stream ``serializer_class(queryset, many=True).data`` as JSON, ``chunk_size`` rows at a time.
+
+    With ``key`` the list is wrapped as ``{key: [...]}`` (after any ``extra``
+    members), matching the envelopes the list views return. Only one chunk of
+    model instances and serialized rows is held in memory at a time.
+    """
+    separator, colon = (',', ':') if api_settings.COMPACT_JSON else (', ', ': ')
+
+    def generate():
+        if key is not None:
+            members = [_dumps(k) + colon + _dumps(v) for k, v in (extra or {}).items()]
+            members.append(_dumps(key) + colon)
+            yield '{' + separator.join(members) + '['
+        else:
+            yield '['
+        first = True
+        for chunk in _chunks(queryset, chunk_size):
+            rows = serializer_class(chunk, many=True, context=context or {}, **(serializer_kwargs or {})).data
+            body = separator.join(_dumps(row) for row in rows)
+            yield body if first else separator + body
+            first = False
+        yield ']}' if key is not None else ']'
+
+    return StreamingHttpResponse(generate(), status=status, content_type='application/json')
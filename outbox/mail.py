@@ -0,0 +1,125 @@
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from main_project.db import write_transaction
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def batch_size():
+    return getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+
+
+def max_attempts():
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+
+
+def retry_delay(attempts):
+    """Seconds before retry number ``attempts``: doubling from EMAIL_OUTBOX_RETRY_DELAY, capped, with jitter."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 30)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'EMAIL_OUTBOX_MAX_RETRY_DELAY', 3600))
+    return delay + random.uniform(0, delay / 10)
+
+
+def lease():
+    # How long a claimed row stays hidden from other workers; a worker that
+    # dies mid-batch leaves its rows to be picked up again after this
+    return timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LEASE', 300))
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Drop-in for send_mail in request paths: store the email for the send_outbox worker."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or '',
+        recipients=list(recipient_list),
+    )
+
+
+def claim_batch(size=None):
+    now = timezone.now()
+    with write_transaction():
+        rows = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:size or batch_size()]
+        )
+        if rows:
+            OutboxEmail.objects.filter(pk__in=[row.pk for row in rows]).update(next_attempt_at=now + lease())
+    return rows
+
+
+def mark_sent(row):
+    OutboxEmail.objects.filter(pk=row.pk).update(
+        status=OutboxEmail.SENT, attempts=F('attempts') + 1, sent_at=timezone.now(), last_error='',
+    )
+
+
+def mark_failed(row, error):
+    attempts = row.attempts + 1
+    if attempts >= max_attempts():
+        logger.error('Giving up on outbox email %s after %s attempts: %s', row.pk, attempts, error)
+        updates = {'status': OutboxEmail.FAILED}
+    else:
+        updates = {'next_attempt_at': timezone.now() + timedelta(seconds=retry_delay(attempts))}
+    OutboxEmail.objects.filter(pk=row.pk).update(attempts=attempts, last_error=str(error)[:2000], **updates)
+    return updates.get('status', OutboxEmail.PENDING)
+
+
+def send_batch(rows):
+    """Send claimed rows over one connection; returns counts per outcome."""
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+
+    def failed(row, error):
+        outcome = mark_failed(row, error)
+        counts['failed' if outcome == OutboxEmail.FAILED else 'retried'] += 1
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning('Could not open the email connection: %s', exc)
+        for row in rows:
+            failed(row, exc)
+        return counts
+
+    try:
+        for row in rows:
+            message = EmailMessage(
+                subject=row.subject,
+                body=row.body,
+                from_email=row.from_email or None,
+                to=row.recipients,
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                logger.warning('Sending outbox email %s failed: %s', row.pk, exc)
+                failed(row, exc)
+            else:
+                mark_sent(row)
+                counts['sent'] += 1
+    finally:
+        connection.close()
+    return counts
+
+
+def drain(size=None):
+    """Send every due email, one batch and one connection at a time."""
+    totals = {'sent': 0, 'retried': 0, 'failed': 0}
+    while True:
+        rows = claim_batch(size)
+        if not rows:
+            return totals
+        for outcome, count in send_batch(rows).items():
+            totals[outcome] += count
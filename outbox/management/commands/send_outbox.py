@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from outbox.mail import drain
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox emails, retrying failures with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send what is due now and exit.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to wait when nothing is due.")
+        parser.add_argument('--batch-size', type=int, help="Emails sent per connection.")
+
+    def handle(self, *args, **options):
+        while True:
+            totals = drain(options['batch_size'])
+            if any(totals.values()):
+                self.stdout.write(
+                    f"Sent {totals['sent']}, retrying {totals['retried']}, gave up on {totals['failed']}."
+                )
+            if options['once']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
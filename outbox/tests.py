@@ -0,0 +1,77 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .mail import claim_batch, drain, queue_mail
+from .models import OutboxEmail
+
+
+class CountingBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return super().open()
+
+
+class FlakyBackend(EmailBackend):
+    # Rejects mail to anyone at bounce.example.com
+    def send_messages(self, messages):
+        for message in messages:
+            if any(address.endswith('@bounce.example.com') for address in message.to):
+                raise ConnectionError('Connection reset by peer')
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+
+    @override_settings(EMAIL_BACKEND='outbox.tests.CountingBackend')
+    def test_worker_sends_batch_over_one_connection(self):
+        CountingBackend.opened = 0
+        for i in range(5):
+            queue_mail(f'Hello {i}', 'Body', None, [f'user{i}@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command('send_outbox', once=True, batch_size=10, stdout=StringIO())
+
+        self.assertEqual([message.subject for message in mail.outbox], [f'Hello {i}' for i in range(5)])
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+
+    @override_settings(EMAIL_BACKEND='outbox.tests.FlakyBackend', EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        queue_mail('Good', 'Body', None, ['ok@example.com'])
+        bad = queue_mail('Bad', 'Body', None, ['nobody@bounce.example.com'])
+
+        self.assertEqual(drain(), {'sent': 1, 'retried': 1, 'failed': 0})
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (OutboxEmail.PENDING, 1))
+        self.assertGreater(bad.next_attempt_at, timezone.now() + timedelta(seconds=25))
+        self.assertIn('Connection reset', bad.last_error)
+        self.assertEqual(claim_batch(), [])
+
+        OutboxEmail.objects.filter(pk=bad.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain(), {'sent': 0, 'retried': 0, 'failed': 1})
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), (OutboxEmail.FAILED, 2))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_claimed_rows_are_leased(self):
+        queue_mail('Hello', 'Body', None, ['user@example.com'])
+        self.assertEqual(len(claim_batch()), 1)
+        self.assertEqual(claim_batch(), [])
+
+    def test_requests_only_queue_mail(self):
+        User.objects.create_user(username='user@example.com', email='user@example.com', password='Passw0rd!')
+        response = APIClient().post('/api/users/forgot-password/', {'email': 'user@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = OutboxEmail.objects.get()
+        self.assertEqual((queued.recipients, queued.status), (['user@example.com'], OutboxEmail.PENDING))
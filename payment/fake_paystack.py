@@ -0,0 +1,169 @@
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+
+# A stand-in for the parts of the Paystack API this project calls, for load
+# tests and local runs (set PAYSTACK_BASE_URL to its url). Every reply waits
+# ``latency`` seconds plus up to ``jitter``; a share of them (``error_rate``)
+# fail with a 5xx. Initialized transactions are kept in memory and verify as
+# successful with their amount. With a ``webhook_url`` each one is also
+# "paid" ``webhook_delay`` seconds after initializing, by posting a signed
+# charge.success event the way Paystack does.
+
+logger = logging.getLogger(__name__)
+
+ERROR_STATUSES = (500, 502, 503)
+
+
+class FakePaystack:
+
+    def __init__(self, host='127.0.0.1', port=0, secret_key='sk_test', latency=0.0, jitter=0.0, error_rate=0.0,
+                 webhook_url=None, webhook_delay=1.0):
+        self.secret_key = secret_key
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.webhook_url = webhook_url
+        self.webhook_delay = webhook_delay
+        self.transactions = {}
+        self.lock = threading.Lock()
+        self.counts = {'initialize': 0, 'verify': 0, 'errors': 0, 'webhooks': 0, 'webhook_failures': 0}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.webhooks = requests.Session()
+
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.url = f'http://{host}:{self.server.server_port}'
+
+    def handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, status, payload):
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except BrokenPipeError:
+                    pass
+
+            def reply(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                fake.enter()
+                try:
+                    status, payload = fake.answer(self.command, urlsplit(self.path).path, body,
+                                                  self.headers.get('Authorization', ''))
+                finally:
+                    fake.leave()
+                self.send_json(status, payload)
+
+            do_GET = do_POST = reply
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.webhooks.close()
+
+    def enter(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self.lock:
+            return {**self.counts, 'transactions': len(self.transactions), 'peak_in_flight': self.peak_in_flight}
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def answer(self, method, path, body, authorization):
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if authorization != f'Bearer {self.secret_key}':
+            return 401, {'status': False, 'message': 'Invalid key'}
+        if random.random() < self.error_rate:
+            self.count('errors')
+            return random.choice(ERROR_STATUSES), {'status': False, 'message': 'Simulated failure'}
+
+        if method == 'POST' and path == '/transaction/initialize':
+            return self.initialize(json.loads(body or b'{}'))
+        if method == 'GET' and path.startswith('/transaction/verify/'):
+            return self.verify(path.rsplit('/', 1)[1])
+        return 404, {'status': False, 'message': 'Not found'}
+
+    def initialize(self, body):
+        self.count('initialize')
+        reference = body.get('reference')
+        if not reference or not body.get('email') or not body.get('amount'):
+            return 400, {'status': False, 'message': 'email, amount and reference are required'}
+        with self.lock:
+            if reference in self.transactions:
+                return 400, {'status': False, 'message': 'Duplicate Transaction Reference'}
+            self.transactions[reference] = {
+                'id': len(self.transactions) + 1,
+                'reference': reference,
+                'amount': int(body['amount']),
+                'customer': {'email': body['email']},
+                'status': 'success',
+            }
+        if self.webhook_url:
+            timer = threading.Timer(self.webhook_delay, self.send_webhook, args=(reference,))
+            timer.daemon = True
+            timer.start()
+        return 200, {'status': True, 'message': 'Authorization URL created', 'data': {
+            'authorization_url': f'{self.url}/checkout/{reference}',
+            'access_code': reference[:12],
+            'reference': reference,
+        }}
+
+    def verify(self, reference):
+        self.count('verify')
+        with self.lock:
+            transaction = self.transactions.get(reference)
+        if transaction is None:
+            return 400, {'status': False, 'message': 'Transaction reference not found'}
+        return 200, {'status': True, 'message': 'Verification successful', 'data': transaction}
+
+    def send_webhook(self, reference):
+        with self.lock:
+            transaction = self.transactions.get(reference)
+        body = json.dumps({'event': 'charge.success', 'data': transaction}).encode()
+        signature = hmac.new(self.secret_key.encode(), body, hashlib.sha512).hexdigest()
+        try:
+            response = self.webhooks.post(self.webhook_url, data=body, timeout=10, headers={
+                'Content-Type': 'application/json', 'X-Paystack-Signature': signature,
+            })
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            self.count('webhook_failures')
+            logger.warning('Webhook for %s failed: %s', reference, exc)
+        else:
+            self.count('webhooks')
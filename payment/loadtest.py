@@ -0,0 +1,158 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean
+
+import requests
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from checkout.models import Cart, CartItem
+from checkout.totals import recompute_totals
+from listings.imports import insert_batch
+from listings.models import Property
+
+# Drives initialize -> verify payment flows through a running Django server
+# (normally with PAYSTACK_BASE_URL pointing at a fake_paystack server) and
+# summarises latency percentiles per step. Buyers, carts and listings for the
+# run are created directly in the database; their usernames share a prefix
+# so cleanup() can remove them afterwards.
+
+USERNAME_PREFIX = 'loadtest-'
+
+
+def prepare_buyers(count, batch_size=500):
+    """Create ``count`` buyers, each with an unpaid one-listing cart; returns their access tokens."""
+    run = uuid.uuid4().hex[:8]
+    with transaction.atomic():
+        agent = User.objects.create_user(username=f'{USERNAME_PREFIX}{run}-agent', password=None)
+        buyers = User.objects.bulk_create(
+            User(username=f'{USERNAME_PREFIX}{run}-{i}', email=f'{USERNAME_PREFIX}{run}-{i}@example.com',
+                 password=make_password(None))
+            for i in range(count)
+        )
+
+        properties = []
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                prop = Property(
+                    user=agent, agent=agent, title=f'Load test {run} #{i}', property_type='SELL',
+                    description='Load test listing', state='Lagos', country='Nigeria', location='Lekki',
+                    bathroom=1, bedroom=1, size=50, price=1000 + i, is_published=True,
+                )
+                prop.set_derived_fields()
+                batch.append(prop)
+            insert_batch(batch)
+            properties.extend(batch)
+
+        carts = Cart.objects.bulk_create(Cart(user=buyer) for buyer in buyers)
+        CartItem.objects.bulk_create(CartItem(cart=cart, property=prop) for cart, prop in zip(carts, properties))
+        recompute_totals(Cart.objects.filter(user__username__startswith=f'{USERNAME_PREFIX}{run}-'))
+
+    return [str(RefreshToken.for_user(buyer).access_token) for buyer in buyers]
+
+
+def cleanup():
+    """Delete every load-test user and, through cascades, their carts, payments and listings."""
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).delete()[0]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarise(samples):
+    latencies = sorted(elapsed for elapsed, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'requests': len(samples),
+        'statuses': statuses,
+        'mean_ms': round(mean(latencies) * 1000, 1) if latencies else None,
+        **{
+            name: round(percentile(latencies, fraction) * 1000, 1) if latencies else None
+            for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99))
+        },
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+    }
+
+
+class LoadTest:
+
+    def __init__(self, base_url, concurrency=50, timeout=30, verify_delay=0.0):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.verify_delay = verify_delay
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def call(self, method, path, token=None, **kwargs):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', headers=headers,
+                                            timeout=self.timeout, **kwargs)
+            status, body = response.status_code, response
+        except requests.RequestException as exc:
+            status, body = type(exc).__name__, None
+        return time.monotonic() - started, status, body
+
+    def flow(self, token):
+        samples = {}
+        elapsed, status, response = self.call('POST', '/api/payment/initialize/', token)
+        samples['initialize'] = (elapsed, status)
+        if status != 200:
+            return samples
+        reference = response.json()['reference']
+        if self.verify_delay:
+            time.sleep(self.verify_delay)
+        elapsed, status, _ = self.call('GET', '/api/payment/verify/', params={'reference': reference})
+        samples['verify'] = (elapsed, status)
+        return samples
+
+    def baseline(self, tokens):
+        """Latency of a few flows run one at a time, before the server is loaded."""
+        return [self.flow(token) for token in tokens]
+
+    def run(self, tokens, warmup=5, server_workers=None):
+        warmup_tokens, tokens = tokens[:warmup], tokens[warmup:]
+        unloaded = self.baseline(warmup_tokens)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='loadtest') as pool:
+            flows = list(pool.map(self.flow, tokens))
+        elapsed = time.monotonic() - started
+        self.session.close()
+
+        report = {'flows': len(flows), 'concurrency': self.concurrency, 'elapsed_seconds': round(elapsed, 2),
+                  'flows_per_second': round(len(flows) / elapsed, 1) if elapsed else None, 'steps': {}}
+        busy = 0.0
+        for step in ('initialize', 'verify'):
+            samples = [flow[step] for flow in flows if step in flow]
+            report['steps'][step] = summarise(samples)
+            base = [flow[step][0] for flow in unloaded if step in flow]
+            report['steps'][step]['unloaded_ms'] = round(mean(base) * 1000, 1) if base else None
+            busy += sum(seconds for seconds, _ in samples)
+
+        # Little's law: requests in the system on average = total time spent
+        # in requests / wall time. The latencies are measured here, so that
+        # counts requests waiting for a worker as well as those being served;
+        # it is not how busy the workers were. Per worker, a value well above
+        # 1 with latency well above the unloaded baseline means requests are
+        # queueing for a worker.
+        report['mean_in_flight'] = round(busy / elapsed, 1) if elapsed else None
+        if server_workers and elapsed:
+            report['server_workers'] = server_workers
+            report['mean_in_flight_per_worker'] = round(busy / elapsed / server_workers, 2)
+        return report
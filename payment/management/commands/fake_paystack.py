@@ -0,0 +1,41 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from payment.fake_paystack import FakePaystack
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the Paystack API. Point PAYSTACK_BASE_URL at it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.2, help="Seconds every reply waits.")
+        parser.add_argument('--jitter', type=float, default=0.1, help="Extra random wait, up to this many seconds.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of replies that fail with a 5xx.")
+        parser.add_argument('--webhook-url', help="Post a signed charge.success here for every transaction.")
+        parser.add_argument('--webhook-delay', type=float, default=1.0,
+                            help="Seconds between initializing a transaction and its webhook.")
+
+    def handle(self, *args, **options):
+        fake = FakePaystack(
+            host=options['host'],
+            port=options['port'],
+            secret_key=settings.PAYSTACK_SECRET_KEY or 'sk_test',
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            webhook_url=options['webhook_url'],
+            webhook_delay=options['webhook_delay'],
+        )
+        fake.start()
+        self.stdout.write(f"Fake Paystack listening on {fake.url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake.stop()
+            self.stdout.write(f"Served: {fake.stats()}")
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from payment.loadtest import LoadTest, cleanup, prepare_buyers
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent initialize/verify payment flows against a running server and report "
+        "p50/p95/p99 latency and requests in flight per server worker. Start the server with PAYSTACK_BASE_URL "
+        "pointing at `manage.py fake_paystack`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the Django server.")
+        parser.add_argument('--flows', type=int, default=1000, help="Payment flows to run.")
+        parser.add_argument('--concurrency', type=int, default=50, help="Flows in progress at once.")
+        parser.add_argument('--server-workers', type=int,
+                            help="Worker processes/threads serving the app, to report requests in flight per worker.")
+        parser.add_argument('--verify-delay', type=float, default=0.0,
+                            help="Seconds between initialize and verify, e.g. to let webhooks arrive first.")
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--keep', action='store_true', help="Keep the load-test users and listings.")
+        parser.add_argument('--cleanup', action='store_true', help="Only delete data left by earlier runs.")
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.stdout.write(f"Deleted {cleanup()} rows.")
+            return
+
+        warmup = 5
+        self.stdout.write(f"Creating {options['flows'] + warmup} buyers with carts...")
+        tokens = prepare_buyers(options['flows'] + warmup)
+        try:
+            test = LoadTest(options['url'], concurrency=options['concurrency'], timeout=options['timeout'],
+                            verify_delay=options['verify_delay'])
+            report = test.run(tokens, warmup=warmup, server_workers=options['server_workers'])
+        finally:
+            if not options['keep']:
+                cleanup()
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payment.reconcile import reconcile
+
+
+class Command(BaseCommand):
+    help = "Verify stale unverified payments against Paystack and settle the successful ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Concurrent Paystack requests.")
+        parser.add_argument('--batch-size', type=int, default=100, help="Payments read and settled per batch.")
+        parser.add_argument('--min-age', type=int, default=30, help="Minutes before a payment counts as stale.")
+        parser.add_argument('--max-age', type=int, default=7 * 24 * 60, help="Minutes after which it is left alone.")
+        parser.add_argument('--recheck', type=int, default=30, help="Minutes before a checked payment is retried.")
+
+    def handle(self, *args, **options):
+        report = reconcile(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            min_age=timedelta(minutes=options['min_age']),
+            max_age=timedelta(minutes=options['max_age']),
+            recheck_after=timedelta(minutes=options['recheck']),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {report['checked']} payments in {report['elapsed_seconds']}s "
+            f"({report['per_second']}/s): {report['settled']} settled, {report['unpaid']} unpaid, "
+            f"{report['errors']} could not be verified."
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from payment.reservations import sweep
+
+
+class Command(BaseCommand):
+    help = "Delete expired property reservations."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Deleted {sweep()} expired reservations."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 21:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0004_propertyreservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="review_reason",
+            field=models.CharField(blank=True, max_length=200),
+        ),
+    ]
@@ -8,6 +8,45 @@ class Payment(models.Model):
     reference = models.CharField(max_length=100, unique=True)
     verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+    # Set by the reconcile_payments worker for payments Paystack has not confirmed
+    paystack_status = models.CharField(max_length=20, blank=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    # Set instead of settling when Paystack took the money but a listing in
+    # the cart had gone to another buyer; the payment needs a refund
+    review_reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], condition=models.Q(verified=False), name='payment_unverified_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.email} - {self.amount} - {self.verified}"
+
+
+class PaystackEvent(models.Model):
+    # Webhook deliveries already handled, keyed by event type and Paystack's
+    # transaction id, so a redelivered event is acknowledged without effect.
+    key = models.CharField(max_length=150, unique=True)
+    event = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class PropertyReservation(models.Model):
+    # A hold on a listing while its buyer pays. The one-to-one column is the
+    # lock: a second buyer's insert fails until the hold is released or has
+    # expired. Expired rows are replaced when the listing is reserved again
+    # and swept in bulk by sweep_reservations.
+    property = models.OneToOneField('listings.Property', on_delete=models.CASCADE, related_name='reservation')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservations')
+    reference = models.CharField(max_length=100, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.property_id} held for {self.reference} until {self.expires_at}"
@@ -0,0 +1,185 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+# One pooled, keep-alive HTTP session per process for Paystack API calls, so
+# requests reuse TCP/TLS connections instead of handshaking every time. Every
+# call has connect/read timeouts; idempotent calls are retried a bounded
+# number of times with jittered exponential backoff. Call counts and latency
+# buckets are kept in the Django cache, like the listing cache stats, so all
+# workers' numbers add up in one place.
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://api.paystack.co'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000)
+METRIC_KEY = 'paystack:{}:{}'
+OUTCOMES = ('ok', 'error', 'unavailable', 'retry')
+
+
+class PaystackError(Exception):
+    """Paystack answered, but refused the request (status false or a 4xx)."""
+
+    def __init__(self, message, status_code=None, payload=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload or {}
+
+
+class PaystackUnavailable(PaystackError):
+    """Paystack could not be reached or kept failing after the allowed retries."""
+
+
+def incr(key, delta=1):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def latency_bucket(elapsed_ms):
+    for bound in LATENCY_BUCKETS_MS:
+        if elapsed_ms < bound:
+            return f'lt_{bound}ms'
+    return f'ge_{LATENCY_BUCKETS_MS[-1]}ms'
+
+
+def all_buckets():
+    return [f'lt_{bound}ms' for bound in LATENCY_BUCKETS_MS] + [f'ge_{LATENCY_BUCKETS_MS[-1]}ms']
+
+
+def record(operation, outcome, elapsed_ms=None):
+    incr(METRIC_KEY.format(operation, outcome))
+    if elapsed_ms is not None:
+        incr(METRIC_KEY.format(operation, 'total_ms'), int(elapsed_ms))
+        incr(METRIC_KEY.format(operation, latency_bucket(elapsed_ms)))
+
+
+def metrics(operations=('initialize', 'verify')):
+    """Per-operation call outcomes, mean latency and latency histogram."""
+    result = {}
+    for operation in operations:
+        names = [*OUTCOMES, 'total_ms', *all_buckets()]
+        values = cache.get_many([METRIC_KEY.format(operation, name) for name in names])
+        counts = {name: values.get(METRIC_KEY.format(operation, name), 0) for name in names}
+        calls = counts['ok'] + counts['error'] + counts['unavailable']
+        result[operation] = {
+            'calls': calls,
+            **{name: counts[name] for name in OUTCOMES},
+            'mean_ms': round(counts['total_ms'] / calls, 1) if calls else None,
+            'latency': {name: counts[name] for name in all_buckets()},
+        }
+    return result
+
+
+class PaystackClient:
+
+    def __init__(self, secret_key=None, base_url=None, timeout=None, max_retries=None,
+                 backoff=None, pool_size=None):
+        self.base_url = (base_url or getattr(settings, 'PAYSTACK_BASE_URL', BASE_URL)).rstrip('/')
+        self.timeout = timeout or getattr(settings, 'PAYSTACK_TIMEOUT', (3.05, 10))
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'PAYSTACK_MAX_RETRIES', 2)
+        self.backoff = backoff if backoff is not None else getattr(settings, 'PAYSTACK_RETRY_BACKOFF', 0.25)
+        pool_size = pool_size or getattr(settings, 'PAYSTACK_POOL_SIZE', 10)
+
+        self.session = requests.Session()
+        # Retries are done here rather than by urllib3, so they can be limited
+        # to idempotent calls and show up in the metrics
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {secret_key if secret_key is not None else settings.PAYSTACK_SECRET_KEY}',
+            'Content-Type': 'application/json',
+        })
+
+    def close(self):
+        self.session.close()
+
+    def sleep_before_retry(self, attempt):
+        # "Full jitter": anywhere up to the exponential bound
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def request(self, operation, method, path, idempotent, **kwargs):
+        url = f'{self.base_url}{path}'
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as exc:
+                elapsed_ms = (time.monotonic() - started) * 1000
+                # A request that may have reached Paystack is only repeated
+                # when repeating it is harmless
+                retryable = idempotent or isinstance(exc, requests.ConnectTimeout)
+                if retryable and attempt < self.max_retries:
+                    record(operation, 'retry', elapsed_ms)
+                    self.sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+                record(operation, 'unavailable', elapsed_ms)
+                logger.warning('Paystack %s failed after %s attempts: %s', operation, attempt + 1, exc)
+                raise PaystackUnavailable(f'Paystack is unavailable: {exc}') from exc
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            if response.status_code in RETRY_STATUSES:
+                if idempotent and attempt < self.max_retries:
+                    record(operation, 'retry', elapsed_ms)
+                    self.sleep_before_retry(attempt)
+                    attempt += 1
+                    continue
+                record(operation, 'unavailable', elapsed_ms)
+                raise PaystackUnavailable(
+                    f'Paystack returned HTTP {response.status_code}', response.status_code, self.payload(response)
+                )
+
+            payload = self.payload(response)
+            if response.status_code >= 400 or payload.get('status') is not True:
+                record(operation, 'error', elapsed_ms)
+                raise PaystackError(
+                    payload.get('message') or f'Paystack returned HTTP {response.status_code}',
+                    response.status_code, payload,
+                )
+            record(operation, 'ok', elapsed_ms)
+            return payload.get('data') or {}
+
+    @staticmethod
+    def payload(response):
+        try:
+            payload = response.json()
+        except ValueError:
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+    def initialize_transaction(self, email, amount, reference, callback_url=None, **extra):
+        body = {'email': email, 'amount': amount, 'reference': reference, **extra}
+        if callback_url:
+            body['callback_url'] = callback_url
+        # Not idempotent: a POST that may have created the transaction is not repeated
+        return self.request('initialize', 'POST', '/transaction/initialize', idempotent=False, json=body)
+
+    def verify_transaction(self, reference):
+        return self.request('verify', 'GET', f'/transaction/verify/{reference}', idempotent=True)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, so its connection pool is shared by every request."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PaystackClient()
+    return _client
@@ -0,0 +1,93 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Payment
+from .paystack import PaystackClient, PaystackError
+from .reservations import release
+from .settlement import settle_payments
+
+# Catches payments whose buyer never came back to the callback that runs
+# VerifyPaymentView (and whose webhook never arrived). Stale unverified
+# payments are read in primary-key batches, verified against Paystack on a
+# bounded thread pool sharing one pooled client, and the confirmed ones are
+# settled together in one transaction per batch.
+
+logger = logging.getLogger(__name__)
+
+
+def stale_payments(now, min_age, max_age, recheck_after):
+    return (
+        Payment.objects.filter(
+            verified=False,
+            review_reason='',
+            created_at__lte=now - min_age,
+            created_at__gte=now - max_age,
+        )
+        .filter(Q(last_checked_at__isnull=True) | Q(last_checked_at__lte=now - recheck_after))
+        .only('id', 'reference', 'amount', 'cart_id')
+        .order_by('pk')
+    )
+
+
+def check(client, reference):
+    """Paystack's view of one transaction: (status, amount), or (None, None) when it can't say."""
+    try:
+        data = client.verify_transaction(reference)
+    except PaystackError as exc:
+        logger.info('Could not verify %s: %s', reference, exc)
+        return None, None
+    return data.get('status'), data.get('amount')
+
+
+def reconcile(client=None, workers=8, batch_size=100, min_age=timedelta(minutes=30),
+              max_age=timedelta(days=7), recheck_after=timedelta(minutes=30)):
+    """Verify stale unverified payments concurrently and settle the successful ones.
+
+    Returns counts plus elapsed seconds and payments checked per second.
+    """
+    own_client = client is None
+    client = client or PaystackClient(pool_size=workers)
+    now = timezone.now()
+    report = {'checked': 0, 'settled': 0, 'unpaid': 0, 'errors': 0}
+    started = time.monotonic()
+    payments = stale_payments(now, min_age, max_age, recheck_after)
+    last_pk = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='reconcile') as pool:
+        while True:
+            batch = list(payments.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            results = list(pool.map(lambda payment: check(client, payment.reference), batch))
+
+            confirmed, unpaid = {}, []
+            for payment, (paystack_status, amount) in zip(batch, results):
+                payment.last_checked_at = timezone.now()
+                if paystack_status == 'success':
+                    confirmed[payment.reference] = amount
+                elif paystack_status is None:
+                    report['errors'] += 1
+                else:
+                    payment.paystack_status = paystack_status[:20]
+                    unpaid.append(payment.reference)
+
+            Payment.objects.bulk_update(batch, ['last_checked_at', 'paystack_status'])
+            if unpaid:
+                # Abandoned or failed: free the listings for other buyers
+                release(unpaid)
+                report['unpaid'] += len(unpaid)
+            report['settled'] += len(settle_payments(confirmed)) if confirmed else 0
+            report['checked'] += len(batch)
+
+    if own_client:
+        client.close()
+    elapsed = time.monotonic() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['per_second'] = round(report['checked'] / elapsed, 1) if elapsed else None
+    return report
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from main_project.db import write_transaction
+
+from .models import PropertyReservation
+
+# Listings in a cart are held for the buyer from payment initialization until
+# the payment settles, fails or the hold runs out, so two buyers can't be
+# charged for the same property. A hold is acquired by inserting its row;
+# the unique property column makes the database refuse a second live hold.
+
+
+class ReservationConflict(Exception):
+
+    def __init__(self, property_ids):
+        super().__init__(f'Properties already reserved: {sorted(property_ids)}')
+        self.property_ids = sorted(property_ids)
+
+
+def hold_duration():
+    return timedelta(minutes=getattr(settings, 'PAYMENT_RESERVATION_MINUTES', 15))
+
+
+def reserve(user, property_ids, reference, now=None):
+    """Hold ``property_ids`` for ``user``'s payment ``reference``, all or none.
+
+    Expired holds and the user's own earlier holds on these listings are
+    replaced. Raises ReservationConflict, holding nothing, when another
+    buyer has a live hold on any of them.
+    """
+    now = now or timezone.now()
+    property_ids = set(property_ids)
+    with write_transaction():
+        PropertyReservation.objects.filter(property_id__in=property_ids).filter(
+            Q(expires_at__lte=now) | Q(user=user)
+        ).delete()
+        try:
+            with transaction.atomic():
+                PropertyReservation.objects.bulk_create([
+                    PropertyReservation(property_id=pk, user=user, reference=reference,
+                                        expires_at=now + hold_duration())
+                    for pk in sorted(property_ids)
+                ])
+        except IntegrityError:
+            held = PropertyReservation.objects.filter(property_id__in=property_ids).values_list(
+                'property_id', flat=True
+            )
+            raise ReservationConflict(set(held))
+
+
+def release(references):
+    return PropertyReservation.objects.filter(reference__in=list(references)).delete()[0]
+
+
+def sweep(now=None):
+    """Delete every expired hold with one statement; returns how many."""
+    return PropertyReservation.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
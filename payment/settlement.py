@@ -0,0 +1,137 @@
+import logging
+
+from django.utils import timezone
+
+from checkout.models import Cart, CartItem
+from listings.bulk import deactivate_properties
+from listings.models import Property
+from main_project.db import write_transaction
+
+from .models import Payment, PropertyReservation
+
+logger = logging.getLogger(__name__)
+
+
+def amount_matches(payment, amount):
+    if amount is None or int(amount) == int(payment.amount):
+        return True
+    logger.error('Paystack amount %s does not match payment %s (%s)', amount, payment.reference, payment.amount)
+    return False
+
+
+def find_conflicts(payments, now=None):
+    """Payments that must not settle, mapped to the reason.
+
+    A payment may take its cart's listings only if they are still on the
+    market and nobody else holds them: the live reservation on each one
+    belongs to this payment's buyer, or there is none (released or
+    expired). A buyer who initialized again holds the listing under the
+    newer reference, but may still pay with the older one. Within
+    ``payments`` each listing goes to the first payment that can have it.
+    """
+    now = now or timezone.now()
+    by_cart = {}
+    for payment in payments:
+        by_cart.setdefault(payment.cart_id, []).append(payment)
+    items = list(
+        CartItem.objects.filter(cart_id__in=list(by_cart)).values_list('cart_id', 'property_id', 'property__is_active')
+    )
+    holders = dict(
+        PropertyReservation.objects.filter(property_id__in=[pk for _, pk, _ in items], expires_at__gt=now)
+        .values_list('property_id', 'user_id')
+    )
+    listings = {}
+    for cart_id, property_id, is_active in items:
+        listings.setdefault(cart_id, []).append((property_id, is_active))
+
+    conflicts, taken = {}, set()
+    for payment in payments:
+        for property_id, is_active in listings.get(payment.cart_id, []):
+            if not is_active or property_id in taken:
+                conflicts[payment.pk] = f'Property {property_id} is no longer available'
+            elif holders.get(property_id, payment.user_id) != payment.user_id:
+                conflicts[payment.pk] = f'Property {property_id} is reserved by another payment'
+            else:
+                continue
+            break
+        else:
+            taken.update(property_id for property_id, _ in listings.get(payment.cart_id, []))
+    return conflicts
+
+
+def mark_for_review(conflicts):
+    for pk, reason in conflicts.items():
+        logger.error('Payment %s was confirmed but cannot be settled: %s', pk, reason)
+        Payment.objects.filter(pk=pk).update(review_reason=reason)
+
+
+def settle_carts(cart_ids):
+    Cart.objects.filter(pk__in=cart_ids).update(is_paid=True)
+    deactivate_properties(Property.objects.filter(cartitem__cart_id__in=cart_ids))
+    # Sold, so any hold on them is moot
+    PropertyReservation.objects.filter(property__cartitem__cart_id__in=cart_ids).delete()
+
+
+def settle_payment(reference, amount=None):
+    """Mark a successful payment: Payment verified, Cart paid, its properties taken off the market.
+
+    Runs as one transaction. The Payment row is locked and then claimed with
+    a conditional UPDATE, so concurrent verifies and webhook deliveries for
+    the same reference settle it exactly once and the rest return the
+    already-settled payment. ``amount`` (in kobo, as Paystack reports it)
+    must match what was initialized when given. Returns the Payment, or None
+    when the reference is unknown or the amount does not match. When a
+    listing in the cart went to another buyer meanwhile, nothing is settled
+    and the returned Payment has ``review_reason`` set.
+    """
+    with write_transaction():
+        payment = Payment.objects.select_for_update().filter(reference=reference).first()
+        if payment is None:
+            logger.warning('Paystack reported unknown reference %s', reference)
+            return None
+        if not amount_matches(payment, amount):
+            return None
+        if payment.review_reason:
+            return payment
+        if not payment.verified:
+            conflicts = find_conflicts([payment])
+            if conflicts:
+                mark_for_review(conflicts)
+                payment.review_reason = conflicts[payment.pk]
+                return payment
+
+        claimed = Payment.objects.filter(pk=payment.pk, verified=False).update(verified=True)
+        payment.verified = True
+        if not claimed:
+            return payment
+
+        settle_carts([payment.cart_id])
+        return payment
+
+
+def settle_payments(confirmed):
+    """Settle many payments in one transaction; ``confirmed`` maps reference -> amount Paystack reported.
+
+    Returns the references this call settled (already verified ones, amount
+    mismatches and payments whose listings went to another buyer are left
+    out).
+    """
+    with write_transaction():
+        payments = [
+            payment
+            for payment in Payment.objects.select_for_update().filter(
+                reference__in=list(confirmed), verified=False, review_reason='',
+            ).order_by('created_at', 'pk')
+            if amount_matches(payment, confirmed[payment.reference])
+        ]
+        conflicts = find_conflicts(payments)
+        if conflicts:
+            mark_for_review(conflicts)
+            payments = [payment for payment in payments if payment.pk not in conflicts]
+        if not payments:
+            return []
+        Payment.objects.filter(pk__in=[payment.pk for payment in payments]).update(
+            verified=True, paystack_status='success',
+        )
+        settle_carts({payment.cart_id for payment in payments})
+    return [payment.reference for payment in payments]
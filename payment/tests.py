@@ -1,3 +1,513 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from checkout.models import Cart, CartItem
+from listings.models import Property, PropertyFacetCell
+from listings.tests import make_property, make_user
+
+from . import paystack
+from .fake_paystack import FakePaystack
+from .loadtest import LoadTest, cleanup, prepare_buyers
+from .models import Payment, PaystackEvent, PropertyReservation
+from .paystack import PaystackClient, PaystackError, PaystackUnavailable
+from .reconcile import reconcile
+from .reservations import sweep
+from .settlement import settle_payment, settle_payments
+
+
+class StubPaystack:
+    """A local HTTP server answering Paystack paths from a queue of canned replies."""
+
+    def __init__(self):
+        self.replies = []
+        self.routes = {}
+        self.requests = []
+        self.connections = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def handle_one_request(self):
+                stub.connections.add(self.client_address)
+                super().handle_one_request()
+
+            def reply(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                stub.requests.append((self.command, self.path, self.headers.get('Authorization'), body))
+                if self.path in stub.routes:
+                    status, payload, delay = stub.routes[self.path]
+                else:
+                    status, payload, delay = stub.replies.pop(0) if stub.replies else (404, {}, 0)
+                time.sleep(delay)
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except BrokenPipeError:
+                    # The client already gave up (timeout tests)
+                    pass
+
+            do_GET = do_POST = reply
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add(self, status, payload, delay=0):
+        self.replies.append((status, payload, delay))
+
+    def route(self, path, status, payload, delay=0):
+        # Fixed reply for one path, for callers that hit paths in any order
+        self.routes[path] = (status, payload, delay)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def stub_paystack(test, timeout=(1, 1)):
+    """Point the app's Paystack client at a new StubPaystack until ``test`` finishes; returns the stub."""
+    stub = StubPaystack()
+    paystack._client = PaystackClient(secret_key='sk_test', base_url=stub.url, timeout=timeout, backoff=0)
+
+    def close_client():
+        paystack._client.close()
+        paystack._client = None
+
+    test.addCleanup(stub.stop)
+    test.addCleanup(close_client)
+    return stub
+
+
+class PaystackClientTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stub = StubPaystack()
+        self.client = PaystackClient(secret_key='sk_test', base_url=self.stub.url, timeout=(1, 0.5), backoff=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_calls_reuse_one_connection(self):
+        for i in range(3):
+            self.stub.add(200, {'status': True, 'data': {'status': 'success', 'reference': f'ref-{i}'}})
+            self.assertEqual(self.client.verify_transaction(f'ref-{i}')['reference'], f'ref-{i}')
+        self.assertEqual(len(self.stub.connections), 1)
+        self.assertEqual(self.stub.requests[0][:3], ('GET', '/transaction/verify/ref-0', 'Bearer sk_test'))
+
+    def test_idempotent_calls_retry_on_server_errors(self):
+        self.stub.add(503, {'status': False})
+        self.stub.add(502, {'status': False})
+        self.stub.add(200, {'status': True, 'data': {'status': 'success'}})
+        self.assertEqual(self.client.verify_transaction('ref')['status'], 'success')
+
+        counts = paystack.metrics()['verify']
+        self.assertEqual((counts['calls'], counts['ok'], counts['retry']), (1, 1, 2))
+
+        for _ in range(3):
+            self.stub.add(503, {'status': False})
+        with self.assertRaises(PaystackUnavailable):
+            self.client.verify_transaction('ref')
+
+    def test_initialize_is_not_retried(self):
+        self.stub.add(503, {'status': False})
+        with self.assertRaises(PaystackUnavailable):
+            self.client.initialize_transaction('buyer@example.com', 5000, 'ref')
+        self.assertEqual(len(self.stub.requests), 1)
+
+        self.stub.add(400, {'status': False, 'message': 'Duplicate Transaction Reference'})
+        with self.assertRaisesMessage(PaystackError, 'Duplicate Transaction Reference'):
+            self.client.initialize_transaction('buyer@example.com', 5000, 'ref')
+
+    def test_slow_responses_time_out(self):
+        self.stub.add(200, {'status': True, 'data': {}}, delay=1.5)
+        started = time.monotonic()
+        with self.assertRaises(PaystackUnavailable):
+            self.client.initialize_transaction('buyer@example.com', 5000, 'ref')
+        self.assertLess(time.monotonic() - started, 1.4)
+        self.assertEqual(paystack.metrics()['initialize']['unavailable'], 1)
+
+
+class PaymentViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stub = stub_paystack(self)
+
+        agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=self.cart, property=make_property(agent, price=1500))
+        self.api = APIClient()
+        self.api.force_authenticate(self.buyer)
+
+    def test_initialize_and_verify(self):
+        self.stub.add(200, {'status': True, 'data': {'authorization_url': 'https://checkout.example/abc'}})
+        response = self.api.post('/api/payment/initialize/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stub.requests[0][3]['amount'], 150000)
+        reference = response.data['reference']
+
+        self.stub.add(200, {'status': True, 'data': {'status': 'success'}})
+        response = self.api.get(f'/api/payment/verify/?reference={reference}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Payment.objects.get(reference=reference).verified)
+
+    def test_unreachable_paystack_is_reported(self):
+        Payment.objects.create(user=self.buyer, cart=self.cart, amount=150000, reference='pending')
+        for _ in range(3):
+            self.stub.add(504, {})
+        response = self.api.get('/api/payment/verify/?reference=pending')
+        self.assertEqual(response.status_code, 503)
+
+
+@override_settings(PAYSTACK_SECRET_KEY='sk_test')
+class PaystackWebhookTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        agent = make_user('agent@example.com', 'agent')
+        self.buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.property = make_property(agent, price=1500)
+        self.cart = Cart.objects.create(user=self.buyer)
+        CartItem.objects.create(cart=self.cart, property=self.property)
+        self.payment = Payment.objects.create(user=self.buyer, cart=self.cart, amount=150000, reference='ref-1')
+
+    def deliver(self, event, secret='sk_test'):
+        body = json.dumps(event).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+        return self.client.post('/api/payment/webhook/', body, content_type='application/json',
+                                HTTP_X_PAYSTACK_SIGNATURE=signature)
+
+    def charge(self, amount=150000):
+        return {'event': 'charge.success',
+                'data': {'id': 42, 'reference': 'ref-1', 'amount': amount, 'status': 'success'}}
+
+    def test_signed_charge_settles_once(self):
+        self.assertEqual(self.deliver(self.charge()).status_code, 200)
+        self.assertEqual(self.deliver(self.charge()).status_code, 200)
+
+        self.payment.refresh_from_db()
+        self.cart.refresh_from_db()
+        self.property.refresh_from_db()
+        self.assertEqual((self.payment.verified, self.cart.is_paid, self.property.is_active), (True, True, False))
+        self.assertEqual(PaystackEvent.objects.count(), 1)
+
+        # Polling is now a local read; no Paystack client is configured to call
+        api = APIClient()
+        with self.assertNumQueries(1):
+            response = api.get('/api/payment/verify/?reference=ref-1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.deliver(self.charge(), secret='wrong').status_code, 400)
+        self.assertFalse(PaystackEvent.objects.exists())
+
+    def test_amount_mismatch_does_not_settle(self):
+        self.deliver(self.charge(amount=100))
+        self.payment.refresh_from_db()
+        self.assertFalse(self.payment.verified)
+
+
+class ConcurrentVerifyTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stub = stub_paystack(self, timeout=(1, 5))
+        agent = make_user('agent@example.com', 'agent')
+        buyer = make_user('buyer@example.com', 'renter/buyer')
+        self.cart = Cart.objects.create(user=buyer)
+        for i in range(5):
+            CartItem.objects.create(cart=self.cart, property=make_property(agent, title=f'House {i}'))
+        Payment.objects.create(user=buyer, cart=self.cart, amount=500000, reference='ref-1')
+
+    def test_parallel_verifies_settle_once(self):
+        workers = 8
+        for _ in range(workers):
+            self.stub.add(200, {'status': True, 'data': {'status': 'success', 'amount': 500000}})
+        barrier = threading.Barrier(workers)
+        statuses = []
+
+        def verify():
+            try:
+                barrier.wait()
+                statuses.append(APIClient().get('/api/payment/verify/?reference=ref-1').status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=verify) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses, [200] * workers)
+        self.cart.refresh_from_db()
+        self.assertTrue(self.cart.is_paid)
+        self.assertFalse(Property.objects.filter(is_active=True).exists())
+        # Settled once: the five listings left the facet counts exactly once
+        self.assertEqual(sum(PropertyFacetCell.objects.values_list('count', flat=True)), 0)
+
+    def test_only_settlement_takes_the_write_lock_up_front(self):
+        with CaptureQueriesContext(connection) as queries:
+            settle_payment('ref-1', 500000)
+            with transaction.atomic():
+                Payment.objects.count()
+        begins = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+        if connection.vendor == 'sqlite':
+            self.assertEqual(begins, ['BEGIN IMMEDIATE', 'BEGIN'])
+            self.assertIsNone(connection.transaction_mode)
+
+
+class ReconcileTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stub = StubPaystack()
+        self.agent = make_user('agent@example.com', 'agent')
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def payment(self, reference, age=timedelta(hours=1), amount=100000):
+        buyer = make_user(f'{reference}@example.com', 'renter/buyer')
+        cart = Cart.objects.create(user=buyer)
+        CartItem.objects.create(cart=cart, property=make_property(self.agent, title=reference))
+        payment = Payment.objects.create(user=buyer, cart=cart, amount=amount, reference=reference)
+        Payment.objects.filter(pk=payment.pk).update(created_at=timezone.now() - age)
+        return payment
+
+    def test_stale_payments_are_verified_and_settled(self):
+        for i in range(6):
+            self.payment(f'paid-{i}')
+            self.stub.route(f'/transaction/verify/paid-{i}', 200,
+                            {'status': True, 'data': {'status': 'success', 'amount': 100000}}, delay=0.2)
+        self.payment('abandoned')
+        self.stub.route('/transaction/verify/abandoned', 200, {'status': True, 'data': {'status': 'abandoned'}})
+        self.payment('short', amount=500000)
+        self.stub.route('/transaction/verify/short', 200,
+                        {'status': True, 'data': {'status': 'success', 'amount': 100}})
+        self.payment('unknown')
+        self.payment('fresh', age=timedelta(minutes=1))
+
+        client = PaystackClient(secret_key='sk_test', base_url=self.stub.url, timeout=(1, 2), backoff=0, max_retries=0)
+        started = time.monotonic()
+        report = reconcile(client=client, workers=6, batch_size=4)
+        client.close()
+
+        # Six slow verifies on six threads take about one delay, not six
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual({key: report[key] for key in ('checked', 'settled', 'unpaid', 'errors')},
+                         {'checked': 9, 'settled': 6, 'unpaid': 1, 'errors': 1})
+        self.assertEqual(set(Payment.objects.filter(verified=True).values_list('reference', flat=True)),
+                         {f'paid-{i}' for i in range(6)})
+        self.assertFalse(Property.objects.filter(title__startswith='paid-', is_active=True).exists())
+        self.assertEqual(Payment.objects.get(reference='abandoned').paystack_status, 'abandoned')
+        self.assertIsNone(Payment.objects.get(reference='fresh').last_checked_at)
+
+        # Checked payments wait for the recheck interval
+        self.assertEqual(reconcile(client=PaystackClient(base_url=self.stub.url))['checked'], 0)
+
+    def test_command_reports_throughput(self):
+        out = StringIO()
+        with override_settings(PAYSTACK_SECRET_KEY='sk_test'):
+            call_command('reconcile_payments', stdout=out)
+        self.assertIn('Checked 0 payments', out.getvalue())
+
+
+class FakePaystackTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.receiver = StubPaystack()
+        self.receiver.route('/hook', 200, {})
+        self.fake = FakePaystack(webhook_url=f'{self.receiver.url}/hook', webhook_delay=0).start()
+        self.client = PaystackClient(secret_key='sk_test', base_url=self.fake.url, backoff=0, max_retries=0)
+
+    def tearDown(self):
+        self.client.close()
+        self.fake.stop()
+        self.receiver.stop()
+
+    def test_initialize_verify_and_webhook(self):
+        data = self.client.initialize_transaction('buyer@example.com', 150000, 'ref-1')
+        self.assertEqual(data['reference'], 'ref-1')
+        self.assertEqual(self.client.verify_transaction('ref-1')['amount'], 150000)
+        with self.assertRaises(PaystackError):
+            self.client.verify_transaction('missing')
+
+        deadline = time.monotonic() + 2
+        while not self.receiver.requests and time.monotonic() < deadline:
+            time.sleep(0.01)
+        method, path, _, event = self.receiver.requests[0]
+        self.assertEqual((method, path, event['event']), ('POST', '/hook', 'charge.success'))
+        self.assertEqual(event['data']['reference'], 'ref-1')
+
+    def test_error_rate(self):
+        self.fake.error_rate = 1
+        with self.assertRaises(PaystackUnavailable):
+            self.client.verify_transaction('ref-1')
+
+    def test_base_url_setting(self):
+        with override_settings(PAYSTACK_BASE_URL=self.fake.url + '/'):
+            self.assertEqual(PaystackClient(secret_key='sk_test').base_url, self.fake.url)
+
+
+@override_settings(PAYSTACK_SECRET_KEY='sk_test', PAYSTACK_CALLBACK_URL='http://localhost/callback')
+class PaymentLoadTestTests(LiveServerTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.fake = FakePaystack(latency=0.01).start()
+        paystack._client = PaystackClient(secret_key='sk_test', base_url=self.fake.url, backoff=0)
+
+    def tearDown(self):
+        paystack._client.close()
+        paystack._client = None
+        self.fake.stop()
+
+    def test_flows_run_end_to_end(self):
+        tokens = prepare_buyers(12)
+        report = LoadTest(self.live_server_url, concurrency=4).run(tokens, warmup=2, server_workers=4)
+
+        self.assertEqual(report['flows'], 10)
+        for step in ('initialize', 'verify'):
+            self.assertEqual(report['steps'][step]['statuses'], {200: 10})
+            self.assertLessEqual(report['steps'][step]['p50_ms'], report['steps'][step]['p99_ms'])
+        self.assertEqual(Payment.objects.filter(verified=True).count(), 12)
+        self.assertEqual(self.fake.stats()['verify'], 12)
+        # Not clamped to 1: flows queueing for a worker count too
+        self.assertAlmostEqual(report['mean_in_flight_per_worker'] * 4, report['mean_in_flight'], delta=0.1)
+
+        cleanup()
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+
+
+@override_settings(PAYSTACK_CALLBACK_URL='http://localhost/callback', PAYMENT_RESERVATION_MINUTES=15)
+class ReservationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.stub = stub_paystack(self)
+        self.stub.route('/transaction/initialize', 200, {'status': True, 'data': {'authorization_url': 'https://x'}})
+
+        agent = make_user('agent@example.com', 'agent')
+        self.house = make_property(agent, price=1500)
+        self.buyers = []
+        for name in ('first', 'second'):
+            buyer = make_user(f'{name}@example.com', 'renter/buyer')
+            CartItem.objects.create(cart=Cart.objects.create(user=buyer), property=self.house)
+            api = APIClient()
+            api.force_authenticate(buyer)
+            self.buyers.append(api)
+
+    def initialize(self, buyer):
+        return self.buyers[buyer].post('/api/payment/initialize/')
+
+    def test_second_buyer_is_turned_away_until_the_hold_expires(self):
+        self.assertEqual(self.initialize(0).status_code, 200)
+        # The same buyer may start over
+        self.assertEqual(self.initialize(0).status_code, 200)
+
+        response = self.initialize(1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['properties'], [self.house.pk])
+        self.assertEqual(len(self.stub.requests), 2)
+
+        PropertyReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.initialize(1).status_code, 200)
+        self.assertEqual(PropertyReservation.objects.get().user.email, 'second@example.com')
+
+    def test_hold_is_released_when_paystack_fails(self):
+        self.stub.route('/transaction/initialize', 400, {'status': False, 'message': 'Invalid email'})
+        self.assertEqual(self.initialize(0).status_code, 400)
+        self.assertFalse(PropertyReservation.objects.exists())
+
+    def test_settlement_releases_and_sold_listings_are_refused(self):
+        reference = self.initialize(0).data['reference']
+        settle_payment(reference)
+        self.assertFalse(PropertyReservation.objects.exists())
+
+        response = self.initialize(1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_paying_with_an_earlier_reference_settles(self):
+        first = self.initialize(0).data['reference']
+        # Initializing again moves the hold to the new reference
+        self.initialize(0)
+
+        payment = settle_payment(first)
+        self.assertTrue(payment.verified)
+        self.assertEqual(payment.review_reason, '')
+        self.assertFalse(Property.objects.get(pk=self.house.pk).is_active)
+        self.assertFalse(PropertyReservation.objects.exists())
+
+    def test_late_payment_after_an_expired_hold_is_not_settled(self):
+        first = self.initialize(0).data['reference']
+        PropertyReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        second = self.initialize(1).data['reference']
+
+        # The first buyer pays after losing the hold, before the second pays
+        payment = settle_payment(first)
+        self.assertIn('reserved by another payment', payment.review_reason)
+        self.assertFalse(Payment.objects.get(reference=first).verified)
+        self.assertTrue(Property.objects.get(pk=self.house.pk).is_active)
+
+        self.assertTrue(settle_payment(second).verified)
+        self.assertFalse(Property.objects.get(pk=self.house.pk).is_active)
+        self.assertEqual(Cart.objects.filter(is_paid=True).get().user.email, 'second@example.com')
+
+        # Paystack reporting the first payment again changes nothing
+        self.assertEqual(settle_payment(first).review_reason, payment.review_reason)
+
+    def test_verify_reports_a_payment_that_lost_its_listing(self):
+        first = self.initialize(0).data['reference']
+        PropertyReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        settle_payment(self.initialize(1).data['reference'])
+
+        self.stub.route(f'/transaction/verify/{first}', 200, {'status': True, 'data': {'status': 'success'}})
+        response = self.buyers[0].get(f'/api/payment/verify/?reference={first}')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('no longer available', Payment.objects.get(reference=first).review_reason)
+
+    def test_batch_settlement_gives_a_listing_to_one_payment(self):
+        # Both holds released, e.g. swept after expiring
+        references = []
+        for buyer in (0, 1):
+            references.append(self.initialize(buyer).data['reference'])
+            PropertyReservation.objects.all().delete()
+
+        self.assertEqual(settle_payments({reference: None for reference in references}), references[:1])
+        self.assertTrue(Payment.objects.get(reference=references[1]).review_reason)
+
+    def test_sweep_deletes_only_expired_holds(self):
+        self.initialize(0)
+        self.assertEqual(sweep(), 0)
+        self.assertEqual(sweep(timezone.now() + timedelta(minutes=16)), 1)
@@ -4,5 +4,6 @@ from .views import *
 urlpatterns = [
     path('initialize/', InitializePaymentView.as_view()),
     path('verify/', VerifyPaymentView.as_view()),
-    # path('webhook/', paystack_webhook),
+    path('paystack/metrics/', PaystackMetricsView.as_view()),
+    path('webhook/', paystack_webhook),
 ]
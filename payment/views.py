@@ -2,18 +2,21 @@ import uuid
 import json
 import hmac
 import hashlib
-import requests
 
 from django.conf import settings
 from django.http import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Payment
-from listings.models import Property
-from checkout.models import Cart
+from .models import Payment, PaystackEvent
+from .paystack import PaystackError, PaystackUnavailable, get_client, metrics as paystack_metrics
+from .reservations import ReservationConflict, release, reserve
+from .settlement import settle_payment
+from main_project.db import write_transaction
+from checkout.models import Cart, CartItem
 
 
 class InitializePaymentView(APIView):
@@ -29,34 +32,39 @@ class InitializePaymentView(APIView):
         amount = int(float(cart.total_price()) * 100)
         reference = str(uuid.uuid4())
 
-        headers = {
-            'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
-            'Content-Type': 'application/json',
-        }
-
-        data = {
-            'email': user.email,
-            'amount': amount,
-            'reference': reference,
-            'callback_url': settings.PAYSTACK_CALLBACK_URL, # frontend
-        }
-
+        listings = dict(CartItem.objects.filter(cart=cart).values_list('property_id', 'property__is_active'))
+        sold = sorted(pk for pk, is_active in listings.items() if not is_active)
+        if sold:
+            return Response({'error': 'Some properties are no longer available', 'properties': sold},
+                            status=status.HTTP_409_CONFLICT)
+        # Hold the listings before anything is charged; a buyer who loses
+        # the race is turned away here rather than paying for them too
         try:
-            response = requests.post('https://api.paystack.co/transaction/initialize', json=data, headers=headers)
-            res_data = response.json()
-
-            if res_data.get("status") is True:
-                Payment.objects.create(user=user, cart=cart, amount=amount, reference=reference)
-                return Response({
-                    "payment_url": res_data["data"]["authorization_url"],
-                    "reference": reference
-                }, status=status.HTTP_200_OK)
-
-            return Response(res_data, status=status.HTTP_400_BAD_REQUEST)
+            reserve(user, listings, reference)
+        except ReservationConflict as e:
+            return Response({'error': 'Some properties are reserved by another buyer', 'properties': e.property_ids},
+                            status=status.HTTP_409_CONFLICT)
 
-        except Exception as e:
+        try:
+            data = get_client().initialize_transaction(
+                email=user.email,
+                amount=amount,
+                reference=reference,
+                callback_url=settings.PAYSTACK_CALLBACK_URL, # frontend
+            )
+        except PaystackUnavailable as e:
+            release([reference])
             return Response({'error': 'Payment initialization failed', 'details': str(e)},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except PaystackError as e:
+            release([reference])
+            return Response(e.payload or {'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        Payment.objects.create(user=user, cart=cart, amount=amount, reference=reference)
+        return Response({
+            "payment_url": data["authorization_url"],
+            "reference": reference
+        }, status=status.HTTP_200_OK)
 
 
 class VerifyPaymentView(APIView):
@@ -67,59 +75,70 @@ class VerifyPaymentView(APIView):
         if not reference:
             return Response({"error": "Reference not provided"}, status=400)
 
-        headers = {
-            "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"
-        }
-
-        response = requests.get(f"https://api.paystack.co/transaction/verify/{reference}", headers=headers)
-        res_data = response.json()
+        # Normally the webhook has already settled it and this is a local read
+        payment = Payment.objects.filter(reference=reference).only('verified').first()
+        if payment is None:
+            return Response({"error": "Payment not found."}, status=404)
+        if payment.verified:
+            return Response({"message": "Payment verified successfully."})
 
-        if res_data['data']['status'] == "success":
-            try:
-                payment = Payment.objects.get(reference=reference)
-                payment.verified = True
-                payment.save()
+        try:
+            data = get_client().verify_transaction(reference)
+        except PaystackUnavailable:
+            return Response({"error": "Payment provider unavailable, try again."},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except PaystackError:
+            return Response({"error": "Payment verification failed."}, status=400)
+
+        if data.get('status') == "success":
+            payment = settle_payment(reference, data.get('amount'))
+            if payment is not None and payment.review_reason:
+                return Response({"error": "A property in your cart was sold to another buyer. "
+                                          "Your payment will be refunded."}, status=status.HTTP_409_CONFLICT)
+            if payment is not None:
+                return Response({"message": "Payment verified successfully."})
 
-                cart = payment.cart
-                cart.is_paid = True
-                cart.save()
+        return Response({"error": "Payment verification failed."}, status=400)
 
-                for item in cart.items.all():
-                    item.property.is_active = False
-                    item.property.save()
 
-                return Response({"message": "Payment verified successfully."})
-            except Payment.DoesNotExist:
-                return Response({"error": "Payment not found."}, status=404)
+class PaystackMetricsView(APIView):
+    permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
 
-        return Response({"error": "Payment verification failed."}, status=400)
+    def get(self, request):
+        return Response(paystack_metrics(), status=status.HTTP_200_OK)
 
 
-# @csrf_exempt
-# def paystack_webhook(request):
-#     paystack_secret = settings.PAYSTACK_SECRET_KEY.encode()
-#     signature = request.META.get('HTTP_X_PAYSTACK_SIGNATURE')
+def event_key(event):
+    data = event.get('data') or {}
+    return f"{event.get('event')}:{data.get('id') or data.get('reference')}"
 
-#     payload = request.body
-#     expected_signature = hmac.new(paystack_secret, payload, hashlib.sha512).hexdigest()
 
-#     if signature != expected_signature:
-#         return HttpResponse(status=400)
+@csrf_exempt
+@require_POST
+def paystack_webhook(request):
+    paystack_secret = (settings.PAYSTACK_SECRET_KEY or '').encode()
+    signature = request.META.get('HTTP_X_PAYSTACK_SIGNATURE', '')
 
-#     event = json.loads(payload.decode('utf-8'))
+    payload = request.body
+    expected_signature = hmac.new(paystack_secret, payload, hashlib.sha512).hexdigest()
 
-#     if event['event'] == 'charge.success':
-#         data = event['data']
-#         reference = data['reference']
-#         metadata = data.get('metadata', {})
-#         property_id = metadata.get('property_id')
+    if not paystack_secret or not hmac.compare_digest(signature, expected_signature):
+        return HttpResponse(status=400)
 
-#         try:
-#             property_obj = Property.objects.get(id=property_id)
-#             property_obj.is_active = False
-#             property_obj.save()
-#         except Property.DoesNotExist:
-#             pass  # Log error optionally
+    try:
+        event = json.loads(payload.decode('utf-8'))
+    except ValueError:
+        return HttpResponse(status=400)
+    data = event.get('data') or {}
 
-#     return HttpResponse(status=200)
+    # Recording the event and applying it commit together: a redelivery
+    # either finds the event already recorded or redoes the whole thing
+    with write_transaction():
+        _, created = PaystackEvent.objects.get_or_create(
+            key=event_key(event),
+            defaults={'event': event.get('event', ''), 'reference': data.get('reference') or '', 'payload': event},
+        )
+        if created and event.get('event') == 'charge.success' and data.get('status', 'success') == 'success':
+            settle_payment(data.get('reference'), data.get('amount'))
 
+    return HttpResponse(status=200)
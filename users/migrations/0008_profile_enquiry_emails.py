@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_image_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="enquiry_digest_sent_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="profile",
+            name="enquiry_emails",
+            field=models.CharField(
+                choices=[("immediate", "Immediate"), ("digest", "Digest")],
+                default="immediate",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -12,6 +12,7 @@ class Country(models.Model):
     code = models.CharField(max_length=10, unique=True)
     currency_code = models.CharField(max_length=10, default='NGN')
     currency_symbol = models.CharField(max_length=5, default='#')
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.name
@@ -25,10 +26,18 @@ class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     country = models.ForeignKey(Country, on_delete=models.SET_NULL, null=True)
     is_email_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # How an agent hears about new enquiries: an email each, or a periodic summary
+    ENQUIRY_EMAIL_CHOICES = (
+        ('immediate', 'Immediate'),
+        ('digest', 'Digest'),
+    )
+    enquiry_emails = models.CharField(max_length=10, choices=ENQUIRY_EMAIL_CHOICES, default='immediate')
+    enquiry_digest_sent_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.user.email} - {self.role}"
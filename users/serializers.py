@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 from django.contrib.auth.password_validation import validate_password
 from .models import *
+from main_project.images import variant_urls
 from django.contrib.auth.hashers import make_password 
 
 
@@ -35,12 +36,16 @@ class ProfileSerializer(serializers.ModelSerializer):
     role = serializers.CharField(read_only = True)
     country = serializers.SerializerMethodField(read_only=True)
     profile_image = serializers.ImageField(use_url=True, required=True)
+    profile_image_variants = serializers.SerializerMethodField(read_only=True)
     class Meta:
         model = Profile
-        fields = ['user','role', 'country', 'profile_image','phone_number']
+        fields = ['user','role', 'country', 'profile_image', 'profile_image_variants', 'phone_number', 'enquiry_emails']
         
     def get_country(self, obj):
         return obj.country.name if obj.country else None
+
+    def get_profile_image_variants(self, obj):
+        return variant_urls(obj, self.context.get('request')).get('profile_image', {})
         
 class UserRegistrationSerializer(serializers.ModelSerializer):
     confirm_password = serializers.CharField(write_only=True)
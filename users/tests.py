@@ -1,3 +1,20 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .models import Country
+
+
+class CountryConditionalGetTests(TestCase):
+
+    def test_etag_changes_when_a_country_is_updated(self):
+        country = Country.objects.create(name='Nigeria', code='NG')
+        client = APIClient()
+
+        first = client.get('/api/users/countries/')
+        self.assertEqual(client.get('/api/users/countries/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+        country.currency_symbol = 'N'
+        country.save()
+        response = client.get('/api/users/countries/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['currency_symbol'], 'N')
@@ -10,7 +10,7 @@ import string
 from .serializers import *
 from .models import *
 from rest_framework.views import APIView
-from django.core.mail import send_mail
+from outbox.mail import queue_mail
 from django.utils.crypto import get_random_string
 from django.contrib.auth import authenticate
 from rest_framework.permissions import IsAuthenticated
@@ -18,6 +18,8 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
 from django.contrib.auth.hashers import make_password # to hash passcode
 from rest_framework.permissions import AllowAny
+from django.db.models import Count, Max
+from main_project.conditional import conditional_get, make_etag
 
 
 def generate_token():
@@ -36,12 +38,11 @@ class RegisterView(APIView):
             )
 
             # Send email
-            send_mail(
+            queue_mail(
                 subject="Verify your email",
                 message=f"Hello {user.first_name},\n\nYour verification code is: {token}",
                 from_email=None,
                 recipient_list=[user.email],
-                fail_silently=False
             )
 
             return Response({"message": "User created. Check your email for verification code."},
@@ -101,7 +102,7 @@ class ResendEmailView(APIView):
             )
 
             # Send verification email
-            send_mail(
+            queue_mail(
                 subject='Verify Your Email',
                 message=f"""
 Hello {user.first_name}!
@@ -114,7 +115,6 @@ This code will expire in 15 minutes. If you didn’t request this, please ignore
 """,
                 from_email=None,  # Set this to your default email if needed
                 recipient_list=[user.email],
-                fail_silently=False
             )
 
             return Response({"message": "Verification email resent. Please check your inbox."}, status=status.HTTP_200_OK)
@@ -184,11 +184,11 @@ class ForgotPasswordView(APIView):
         PasswordResetOTP.objects.create(user=user, otp=otp)
 
         # Send the OTP via email
-        send_mail(
+        queue_mail(
             "Your Password Reset OTP",
             f"Your OTP code is {otp}. It expires in 10 minutes.",
+            None,
             [email],
-            fail_silently=False,
         )
 
         return Response({"message": "If the email exists, an OTP has been sent."}, status=status.HTTP_200_OK)
@@ -256,8 +256,14 @@ class LogoutView(APIView):
         except Exception as e:
             return Response({ "error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+def country_list_version(request):
+    version = Country.objects.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    return make_etag('countries', version['count'], version['last_modified']), version['last_modified']
+
+
 class CountryView(APIView):
     
+    @conditional_get(country_list_version)
     def get(self, request):
         try:
             countries = Country.objects.all()
@@ -314,7 +320,7 @@ class VerifyOldPasswordView(APIView):
             )
             
             # send email
-            send_mail(
+            queue_mail(
                 subject = 'OTP',
                 message = f'Your OTP is {otp}. It expires in 5 minutes',
                 from_email= None,